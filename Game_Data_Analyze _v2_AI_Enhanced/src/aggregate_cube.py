@@ -0,0 +1,112 @@
+# @Author : Yulia
+# @File   : aggregate_cube.py
+# @Time   : 2025/9/15
+
+import numpy as np
+import pandas as pd
+
+from filter_index import FILTER_COLUMNS, PURCHASE_VALUES
+
+
+# One cell per sidebar-filter combination.
+CUBE_DIMS = FILTER_COLUMNS
+
+# Integer measures summed per cell (sums and sums of squares stay exact in int64).
+CUBE_MEASURES = ["Age", "SessionsPerWeek", "InGamePurchases"]
+
+
+def build_cube(df):
+    """
+    Counts, sums and sums of squares of the Overview measures per
+    Location x GameGenre x Gender x InGamePurchases cell, plus the number of highly
+    engaged and high-risk players. Built once per loaded frame.
+    """
+    dims = [c for c in CUBE_DIMS if c in df.columns]
+    work = pd.DataFrame({c: df[c] for c in dims})
+    work["n"] = np.ones(len(df), dtype=np.int64)
+    for col in CUBE_MEASURES:
+        if col in df.columns:
+            values = df[col].astype(np.int64)
+            work[f"{col}_sum"] = values
+            work[f"{col}_sumsq"] = values * values
+    if "EngagementLevel" in df.columns:
+        work["HighEngagement"] = (df["EngagementLevel"] == "High").astype(np.int64)
+    if "Risk_Level" in df.columns:
+        work["HighRisk"] = (df["Risk_Level"] == "High Risk 🔴").astype(np.int64)
+    return work.groupby(dims, observed=True, dropna=False, sort=False).sum().reset_index()
+
+
+def cell_codes(keys):
+    """
+    Cell number of every row of `keys` (one column per dimension) and the table of
+    distinct cells, without a groupby: per-column codes are combined into one integer.
+    """
+    combined = np.zeros(len(keys), dtype=np.int64)
+    uniques = []
+    for col in keys.columns:
+        codes, values = pd.factorize(keys[col], use_na_sentinel=False)
+        combined = combined * len(values) + codes
+        uniques.append(values)
+    row_cells, cell_ids = pd.factorize(combined)
+
+    columns = {}
+    for col, values in zip(reversed(list(keys.columns)), reversed(uniques)):
+        columns[col] = np.asarray(values, dtype=object)[cell_ids % len(values)]
+        cell_ids = cell_ids // len(values)
+    return row_cells, pd.DataFrame({col: columns[col] for col in keys.columns})
+
+
+def cell_mask(cells, selected_region, genres, genders, purchase_filter):
+    """
+    Boolean mask of the cells (rows of a per-cell table) matching the sidebar selection.
+    """
+    mask = np.ones(len(cells), dtype=bool)
+    if selected_region != "Global" and "Location" in cells.columns:
+        mask &= (cells["Location"] == selected_region).to_numpy()
+    if genres and "GameGenre" in cells.columns:
+        mask &= cells["GameGenre"].isin(genres).to_numpy()
+    if genders and "Gender" in cells.columns:
+        mask &= cells["Gender"].isin(genders).to_numpy()
+    if purchase_filter in PURCHASE_VALUES and "InGamePurchases" in cells.columns:
+        mask &= (cells["InGamePurchases"] == PURCHASE_VALUES[purchase_filter]).to_numpy()
+    return mask
+
+
+def query_cube(cube, selected_region, genres, genders, purchase_filter):
+    """
+    KPIs of a sidebar selection, merged from the matching cells.
+    """
+    measures = [c for c in cube.columns if c not in CUBE_DIMS]
+    totals = cube.loc[cell_mask(cube, selected_region, genres, genders, purchase_filter), measures].sum()
+    n = int(totals["n"])
+
+    def mean_of(col):
+        return totals[f"{col}_sum"] / n if f"{col}_sum" in totals and n else float("nan")
+
+    high_risk = int(totals["HighRisk"]) if "HighRisk" in totals else 0
+    return {
+        "total_users": n,
+        "avg_age": mean_of("Age"),
+        "avg_sessions": mean_of("SessionsPerWeek"),
+        "pay_rate": mean_of("InGamePurchases"),
+        "high_engagement_rate": totals["HighEngagement"] / n if "HighEngagement" in totals and n else None,
+        "high_risk_count": high_risk,
+        "risk_ratio": high_risk / n if n > 0 else 0,
+    }
+
+
+def kpis_from_rows(df):
+    """
+    The same KPIs computed by scanning the rows (used when no cube is available).
+    """
+    total_users = len(df)
+    high_risk = int((df["Risk_Level"] == "High Risk 🔴").sum()) if "Risk_Level" in df.columns else 0
+    return {
+        "total_users": total_users,
+        "avg_age": df["Age"].mean(),
+        "avg_sessions": df["SessionsPerWeek"].mean(),
+        "pay_rate": df["InGamePurchases"].mean(),
+        "high_engagement_rate": (df["EngagementLevel"] == "High").mean() if "EngagementLevel" in df.columns else None,
+        "high_risk_count": high_risk,
+        "risk_ratio": high_risk / total_users if total_users > 0 else 0,
+    }
@@ -0,0 +1,420 @@
+# @Author : Yulia
+# @File   : ai_pipeline.py
+# @Time   : 2025/9/10
+
+import multiprocessing as mp
+import os
+import tempfile
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+from threadpoolctl import threadpool_limits
+from sklearn.preprocessing import StandardScaler
+from sklearn.cluster import KMeans, kmeans_plusplus
+from sklearn.linear_model import LogisticRegression
+from sklearn.model_selection import StratifiedKFold
+from sklearn.metrics import accuracy_score, brier_score_loss, precision_score, recall_score, roc_auc_score
+
+import ai_persona
+import model_store
+from instrumentation import traced
+
+
+CLU_FEATURES = ["Age", "SessionsPerWeek", "PlayerLevel", "InGamePurchases"]
+PRED_FEATURES = ["Age", "PlayerLevel", "InGamePurchases"]
+
+# Changing any value here (or the features above) invalidates the stored models;
+# "version" is bumped when the training procedure changes without a config change.
+PIPELINE_CONFIG = {
+    "n_clusters": 5,
+    "random_state": 42,
+    "n_init": 10,
+    "max_iter": 1000,
+    "churn_sessions": 2,
+    "version": 2,
+}
+
+
+# Churn probability cut-offs and the risk levels they separate (lowest first).
+RISK_THRESHOLDS = [0.4, 0.7]
+RISK_LEVELS = ["Safe 🟢", "Medium Risk 🟡", "High Risk 🔴"]
+
+PIPELINE_FEATURES = sorted(set(CLU_FEATURES + PRED_FEATURES + ["SessionsPerWeek"]))
+
+# Training processes (AI_PIPELINE_WORKERS overrides the core count). Below
+# PARALLEL_MIN_ROWS the fits are faster than starting a process pool.
+TRAINING_WORKERS = int(os.environ.get("AI_PIPELINE_WORKERS", 0)) or os.cpu_count() or 1
+PARALLEL_MIN_ROWS = 200_000
+
+# Churn model evaluation: stratified K-fold cross-validation, and the number of
+# equal-width probability bins of its calibration table.
+CV_FOLDS = 5
+CALIBRATION_BINS = 10
+
+
+def churn_labels(df, config=PIPELINE_CONFIG):
+    # Define churn as fewer than 2 sessions per week.
+    return (df["SessionsPerWeek"] < config["churn_sessions"]).astype(int)
+
+
+def kmeans_init_centers(X_scaled, config=PIPELINE_CONFIG):
+    """
+    The k-means++ initial centers of the config["n_init"] initializations, drawn one
+    after another from one RandomState(random_state) on the mean-centered data, as
+    KMeans(n_init=n_init, random_state=random_state).fit does. Fitting each from its
+    centers (_fit_kmeans_init) and keeping the best as pick_best_kmeans does gives
+    that clustering, for any number of workers.
+    """
+    X_mean = X_scaled.mean(axis=0)
+    X_centered = X_scaled - X_mean
+    x_squared_norms = np.einsum("ij,ij->i", X_centered, X_centered)
+    random_state = np.random.RandomState(config["random_state"])
+    return [kmeans_plusplus(X_centered, config["n_clusters"], x_squared_norms=x_squared_norms,
+                            random_state=random_state)[0] + X_mean
+            for _ in range(config["n_init"])]
+
+
+def _same_clustering(labels1, labels2, n_clusters):
+    # True when the two labelings only differ by a permutation of the cluster ids.
+    mapping = np.full(n_clusters, -1)
+    mapping[labels1] = labels2
+    return np.array_equal(mapping[labels1], labels2)
+
+
+def pick_best_kmeans(fits, n_clusters):
+    """
+    The fit KMeans(n_init=...) keeps: the first one, replaced by a later one only
+    when its inertia is lower and its clustering differs (not a mere relabelling).
+    """
+    best = None
+    for kmeans in fits:
+        if best is None or (kmeans.inertia_ < best.inertia_
+                            and not _same_clustering(kmeans.labels_, best.labels_, n_clusters)):
+            best = kmeans
+    return best
+
+
+# Large inputs reach pool workers as the path of a .npy file, memory-mapped once per
+# worker process, so each task only pickles its own arguments (e.g. initial centers).
+_mapped = {}
+
+
+def _share_array(array, directory, name):
+    path = os.path.join(directory, f"{name}.npy")
+    np.save(path, np.ascontiguousarray(array))
+    return path
+
+
+def _shared_array(source):
+    if not isinstance(source, str):
+        return source
+    if source not in _mapped:
+        _mapped[source] = np.load(source, mmap_mode="r")
+    return _mapped[source]
+
+
+def _fit_kmeans_init(X_scaled, centers, single_thread):
+    # Only the Lloyd iterations run here; the initial centers come from kmeans_init_centers.
+    start = time.perf_counter()
+    X_scaled = _shared_array(X_scaled)
+    kmeans = KMeans(n_clusters=len(centers), init=centers, n_init=1)
+    if single_thread:
+        # Worker processes share the cores: keep each fit to one OpenMP thread.
+        with threadpool_limits(1):
+            kmeans.fit(X_scaled)
+    else:
+        kmeans.fit(X_scaled)
+    return kmeans, time.perf_counter() - start
+
+
+def _fit_churn_model(X_pred, y_pred, max_iter):
+    start = time.perf_counter()
+    model = LogisticRegression(max_iter=max_iter)
+    try:
+        model.fit(X_pred, y_pred)
+    except Exception:
+        model = None
+    return model, time.perf_counter() - start
+
+
+def _fit_churn_fold(X_pred, y_pred, train_rows, test_rows, max_iter, single_thread):
+    start = time.perf_counter()
+    if single_thread:
+        with threadpool_limits(1):
+            model, _ = _fit_churn_model(X_pred[train_rows], y_pred[train_rows], max_iter)
+    else:
+        model, _ = _fit_churn_model(X_pred[train_rows], y_pred[train_rows], max_iter)
+    probs = model.predict_proba(X_pred[test_rows])[:, 1] if model is not None else None
+    return probs, time.perf_counter() - start
+
+
+def churn_metrics(y_true, probs, thresholds=RISK_THRESHOLDS, bins=CALIBRATION_BINS):
+    """
+    Accuracy (at 0.5, as LogisticRegression.predict), ROC-AUC, Brier score,
+    precision / recall of flagging players above each risk threshold, and the
+    calibration table (mean predicted vs observed churn rate per probability bin).
+    """
+    y_true, probs = np.asarray(y_true), np.asarray(probs, dtype=float)
+    both_classes = len(np.unique(y_true)) > 1
+    metrics = {
+        "n": int(len(y_true)),
+        "churn_rate": float(y_true.mean()),
+        "accuracy": float(accuracy_score(y_true, probs > 0.5)),
+        "roc_auc": float(roc_auc_score(y_true, probs)) if both_classes else None,
+        "brier": float(brier_score_loss(y_true, probs)),
+        "thresholds": [{"threshold": t,
+                        "flagged": int((probs > t).sum()),
+                        "precision": float(precision_score(y_true, probs > t, zero_division=0)),
+                        "recall": float(recall_score(y_true, probs > t, zero_division=0))}
+                       for t in thresholds],
+    }
+    bin_ids = np.minimum((probs * bins).astype(int), bins - 1)
+    counts = np.bincount(bin_ids, minlength=bins)
+    predicted = np.bincount(bin_ids, weights=probs, minlength=bins)
+    observed = np.bincount(bin_ids, weights=y_true, minlength=bins)
+    metrics["calibration"] = [{"bin": f"{b / bins:.1f}-{(b + 1) / bins:.1f}", "players": int(counts[b]),
+                               "mean_predicted": float(predicted[b] / counts[b]),
+                               "observed_rate": float(observed[b] / counts[b])}
+                              for b in np.flatnonzero(counts)]
+    return metrics
+
+
+@traced()
+def evaluate_churn_model(df, config=PIPELINE_CONFIG, folds=CV_FOLDS, workers=None):
+    """
+    Out-of-sample quality of the churn model: stratified `folds`-fold cross-validation
+    with the training config, the folds fitted concurrently on a process pool on large
+    frames (as in train_models). Metrics are computed over the pooled out-of-fold
+    probabilities (see churn_metrics), plus per-fold accuracy / ROC-AUC.
+    Returns None when the churn model cannot be trained on `df`.
+    """
+    pred_features = [c for c in PRED_FEATURES if c in df.columns]
+    if "SessionsPerWeek" not in df.columns or not pred_features:
+        return None
+    y_pred = churn_labels(df, config).to_numpy()
+    folds = min(folds, int(np.bincount(y_pred, minlength=2).min()))
+    if folds < 2:
+        return None
+
+    start = time.perf_counter()
+    workers = workers or TRAINING_WORKERS
+    parallel = workers > 1 and len(df) >= PARALLEL_MIN_ROWS
+    X_pred = df[pred_features].fillna(0).to_numpy(dtype=np.float64)
+    splits = list(StratifiedKFold(folds, shuffle=True, random_state=config["random_state"]).split(X_pred, y_pred))
+
+    with (ProcessPoolExecutor(min(workers, folds), mp_context=mp.get_context("spawn")) if parallel
+          else _InlineExecutor()) as pool:
+        futures = [pool.submit(_fit_churn_fold, X_pred, y_pred, train_rows, test_rows, config["max_iter"], parallel)
+                   for train_rows, test_rows in splits]
+        results = [f.result() for f in futures]
+    if any(probs is None for probs, _ in results):
+        return None
+
+    oof = np.empty(len(y_pred))
+    fold_scores = []
+    for (_, test_rows), (probs, seconds) in zip(splits, results):
+        oof[test_rows] = probs
+        y_test = y_pred[test_rows]
+        fold_scores.append({"accuracy": float(accuracy_score(y_test, probs > 0.5)),
+                            "roc_auc": float(roc_auc_score(y_test, probs)) if len(np.unique(y_test)) > 1 else None,
+                            "fit_s": seconds})
+
+    evaluation = churn_metrics(y_pred, oof)
+    evaluation.update(folds=folds, fold_scores=fold_scores, workers=workers if parallel else 1,
+                      seconds=time.perf_counter() - start)
+    return evaluation
+
+
+@traced()
+def train_models(df, config=PIPELINE_CONFIG, workers=None):
+    """
+    Fit the scaler + K-Means clusterer and the churn Logistic Regression.
+    Stages whose columns are missing (or whose fit fails) are stored as None.
+
+    The K-Means initializations and the churn model are independent, so on large
+    frames they run concurrently on a process pool of `workers` processes (default
+    TRAINING_WORKERS). The initial centers are drawn here as KMeans(n_init=...) draws
+    them, so the clustering equals a single KMeans fit. Per-stage wall-clock times
+    are stored in models["timings"].
+    """
+    workers = workers or TRAINING_WORKERS
+    parallel = workers > 1 and len(df) >= PARALLEL_MIN_ROWS
+    start = time.perf_counter()
+    models = {"clu_features": [c for c in CLU_FEATURES if c in df.columns],
+              "pred_features": [c for c in PRED_FEATURES if c in df.columns],
+              "scaler": None, "kmeans": None, "churn_model": None,
+              "stats": {"n": len(df), "churn_rate": None, "cluster_counts": None, "cluster_sums": None},
+              "timings": {"workers": workers if parallel else 1}}
+
+    # Stage inputs
+    X_scaled, X_pred, y_pred = None, None, None
+    if models["clu_features"]:
+        X_clu = df[models["clu_features"]].fillna(0)
+        scaler = StandardScaler()
+        X_scaled = scaler.fit_transform(X_clu)
+        models["scaler"] = scaler
+    if "SessionsPerWeek" in df.columns and models["pred_features"]:
+        X_pred = df[models["pred_features"]].fillna(0)
+        y_pred = churn_labels(df, config)
+        models["stats"]["churn_rate"] = float(y_pred.mean())
+    models["timings"]["prepare"] = time.perf_counter() - start
+
+    # Stage wall-clock: first task submitted -> last task of the stage finished, both
+    # read in this thread (inline tasks are finished when submit returns).
+    started_at, done_at, pending = {}, {}, {}
+
+    def submit(pool, stage, fn, *args):
+        started_at.setdefault(stage, time.perf_counter())
+        future = pool.submit(fn, *args)
+        if future.done():
+            done_at[stage] = time.perf_counter()
+        else:
+            pending[future] = stage
+        return future
+
+    with tempfile.TemporaryDirectory(prefix="ai-pipeline-") as shared_dir, \
+            (ProcessPoolExecutor(workers, mp_context=mp.get_context("spawn")) if parallel
+             else _InlineExecutor()) as pool:
+        # --- B. Predictive Analytics (Churn Risk) --- submitted first: a single long task
+        churn_future = None
+        if X_pred is not None:
+            churn_future = submit(pool, "churn_model", _fit_churn_model, X_pred, y_pred, config["max_iter"])
+
+        # --- A. AI Clustering (K-Means) --- one task per initialization, all reading
+        # the same scaled matrix (shared once through a file on the process pool)
+        init_futures = []
+        if X_scaled is not None:
+            X_shared = _share_array(X_scaled, shared_dir, "X_scaled") if parallel else X_scaled
+            init_futures = [submit(pool, "kmeans", _fit_kmeans_init, X_shared, centers, parallel)
+                            for centers in kmeans_init_centers(X_scaled, config)]
+
+        for future in as_completed(pending):
+            done_at[pending[future]] = time.perf_counter()
+
+        if init_futures:
+            kmeans = pick_best_kmeans([f.result()[0] for f in init_futures], config["n_clusters"])
+            models["kmeans"] = kmeans
+            models["stats"].update(cluster_stats(X_scaled, kmeans.labels_, config["n_clusters"]))
+            models["timings"]["kmeans"] = done_at["kmeans"] - started_at["kmeans"]
+        if churn_future is not None:
+            models["churn_model"] = churn_future.result()[0]
+            models["timings"]["churn_model"] = done_at["churn_model"] - started_at["churn_model"]
+
+    models["timings"]["total"] = time.perf_counter() - start
+    return models
+
+
+class _InlineExecutor:
+    """
+    Executor stand-in that runs tasks immediately in this process (small frames,
+    single worker), so both paths share the same code.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+
+def cluster_stats(X_scaled, labels, n_clusters):
+    """
+    Per-cluster row counts and feature sums in scaled space. They add up across
+    batches, which is what the drift check in player_store relies on.
+    """
+    counts = np.bincount(labels, minlength=n_clusters)
+    sums = np.zeros((n_clusters, X_scaled.shape[1]))
+    np.add.at(sums, labels, X_scaled)
+    return {"cluster_counts": counts.tolist(), "cluster_sums": sums.tolist()}
+
+
+def risk_levels(probs):
+    """
+    Risk level classification: > 0.7 High, > 0.4 Medium, otherwise Safe.
+    Vectorized: the level is the number of thresholds a probability exceeds.
+    """
+    probs = np.asarray(probs, dtype=float)
+    codes = np.zeros(len(probs), dtype=np.int8)
+    for threshold in RISK_THRESHOLDS:
+        codes += probs > threshold
+    return pd.Categorical.from_codes(codes, categories=RISK_LEVELS)
+
+
+@traced()
+def score_players(df, models, config=PIPELINE_CONFIG):
+    """
+    Add Cluster/Persona, Is_Churn, Churn_Prob and Risk_Level using fitted models.
+    """
+    if models["kmeans"] is not None:
+        X_scaled = models["scaler"].transform(df[models["clu_features"]].fillna(0))
+        df["Cluster"] = models["kmeans"].predict(X_scaled)
+
+        # Tagging using the LLM module
+        df = ai_persona.apply_persona_tags(df)
+    else:
+        # If the columns are incorrect, provide a default value to prevent subsequent code crashes.
+        df["Persona"] = "Standard Player"
+
+    if "SessionsPerWeek" in df.columns:
+        df["Is_Churn"] = churn_labels(df, config)
+
+    if models["churn_model"] is not None:
+        df["Churn_Prob"] = models["churn_model"].predict_proba(df[models["pred_features"]].fillna(0))[:, 1]
+    else:
+        df["Churn_Prob"] = 0.0
+
+    df["Risk_Level"] = risk_levels(df["Churn_Prob"])
+    return df
+
+
+def ensure_evaluation(df, models, config=PIPELINE_CONFIG):
+    """
+    Cross-validate the churn model once per model fingerprint: the result is kept in
+    models["evaluation"] and stored with the artifact (artifacts saved before the
+    evaluation stage existed get it added on first use).
+    """
+    if "evaluation" not in models:
+        models["evaluation"] = evaluate_churn_model(df, config)
+        if "key" in models:
+            model_store.save_models(models["key"], models)
+    return models["evaluation"]
+
+
+def get_models(df, config=PIPELINE_CONFIG):
+    """
+    Models for this training data, reused from the artifact store when the data
+    and config are unchanged; otherwise trained, cross-validated and stored first.
+    """
+    models = model_store.get_or_train(df, train_models, PIPELINE_FEATURES, config)
+    ensure_evaluation(df, models, config)
+    return models
+
+
+def run_pipeline(df, config=PIPELINE_CONFIG):
+    """
+    Score the players with the (stored or freshly trained) models.
+    """
+    return score_players(df, get_models(df, config), config)
+
+
+if __name__ == "__main__":
+    import sys
+    from data_loader import CLEAN_FILE
+    from schema import PIPELINE_COLUMNS, apply_schema
+
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000
+    base = apply_schema(pd.read_csv(CLEAN_FILE, usecols=lambda c: c in PIPELINE_COLUMNS))
+    data = base.sample(rows, replace=True, random_state=0).reset_index(drop=True)
+    for n in sorted({1, TRAINING_WORKERS}):
+        timings = train_models(data, workers=n)["timings"]
+        print(f"{rows} rows, {n} worker(s): " + " | ".join(f"{k} {v:.2f}s" for k, v in timings.items() if k != "workers"))
+        evaluation = evaluate_churn_model(data, workers=n)
+        print(f"{rows} rows, {n} worker(s): {evaluation['folds']}-fold CV {evaluation['seconds']:.2f}s | "
+              f"accuracy {evaluation['accuracy']:.3f} | ROC-AUC {evaluation['roc_auc']:.3f}")
@@ -2,24 +2,42 @@
 # @File   : app.py
 # @Time   : 2025/9/6
 
+import threading
+import uuid
+from functools import partial
+
 import streamlit as st
-from data_loader import load_data, filter_data
+import instrumentation
+from data_loader import (load_catalog, load_model_evaluation, load_segment, segment_kpis, segment_pearson,
+                         segment_retention, segment_top_risk)
 from overview import render_overview
 from retention import render_retention_funnel
 from simulation_trend import render_trend
 from correlation import render_correlation
 from clustering import render_clustering
 from prediction import render_prediction
-from report_export import export_full_report
+from report_job import REPORT_MODULES, ReportJob
 
 # Page Setting
 st.set_page_config(page_title="AI-Enhanced Game Analytics Dashboard", layout="wide", page_icon="🎮")
 
+# The Performance panel switches (section 6) apply from the top of the run, so the
+# stages of this run are already traced when it is turned on. They belong to this
+# session only: its spans are tagged with its own scope.
+perf_scope = st.session_state.setdefault("perf_scope", uuid.uuid4().hex)
+if "perf_enabled" in st.session_state:
+    instrumentation.configure(enabled=st.session_state["perf_enabled"], memory=st.session_state["perf_memory"],
+                              log_file=(instrumentation.settings()["log_file"] or instrumentation.DEFAULT_LOG_FILE)
+                              if st.session_state["perf_log"] else None, scope=perf_scope)
+else:
+    instrumentation.configure(scope=perf_scope)
+run_mark = instrumentation.mark()
+
 # =====================
-# 1. Load Data (Backend AI Processing happens here)
+# 1. Load Catalog (Backend AI Processing happens here on first run)
 # =====================
 with st.spinner("Loading data and running AI models..."):
-    df, df_europe = load_data()
+    catalog = load_catalog()
 
 # =====================
 # 2. Sidebar Controls
@@ -27,15 +45,15 @@ with st.spinner("Loading data and running AI models..."):
 st.sidebar.header("🌍 Filters")
 
 # Region Filter
-all_regions = df['Location'].unique().tolist() if 'Location' in df.columns else []
+all_regions = catalog.get("Location", [])
 selected_region = st.sidebar.selectbox("Select Region", ["Global"] + all_regions)
 
 # Game Type Filter
-all_genres = df["GameGenre"].unique() if 'GameGenre' in df.columns else []
+all_genres = catalog.get("GameGenre", [])
 genres = st.sidebar.multiselect("Select Game Type", all_genres)
 
 # Gender Filter
-all_genders = df["Gender"].unique() if 'Gender' in df.columns else []
+all_genders = catalog.get("Gender", [])
 genders = st.sidebar.multiselect("Select Gender", all_genders)
 
 # Purchase Filter
@@ -55,9 +73,11 @@ section = st.sidebar.radio(
 )
 
 # =====================
-# 3. Filter Data
+# 3. Load & Filter Data (only the partition of the selected region is read;
+#    segments are cached, so switching modules does not filter again)
 # =====================
-filtered_data = filter_data(df, selected_region, genres, genders, purchase_filter)
+with st.spinner("Loading data..."):
+    filtered_data = load_segment(selected_region, genres, genders, purchase_filter)
 
 if len(filtered_data) == 0:
     st.warning("⚠️ No data available for the selected filters. Please adjust your selection.")
@@ -69,71 +89,104 @@ if len(filtered_data) == 0:
 st.title("🎮 AI-Enhanced Player Behavior Analytics")
 st.markdown(f"**Current View:** {section} | **Players Selected:** {len(filtered_data)}")
 
-# Initialize variables for report export
-metrics = None
-all_figs = {}
-results_df = None
-model_acc = None
-
 # --- Routing ---
 
 if section == "Overview":
-    metrics, figs_overview = render_overview(filtered_data, selected_region)
-    all_figs.update(figs_overview)
+    kpis = segment_kpis(selected_region, genres, genders, purchase_filter)
+    render_overview(filtered_data, selected_region, kpis=kpis)
 
 elif section == "Retention & Funnel":
-    fig_ret, fig_fun = render_retention_funnel(filtered_data)
-    if fig_ret: all_figs["Retention Rate"] = fig_ret
-    if fig_fun: all_figs["Funnel Analysis"] = fig_fun
+    hist = segment_retention(selected_region, genres, genders, purchase_filter)
+    render_retention_funnel(filtered_data, hist=hist)
 
 elif section == "Simulated Trend":
-    fig_new, fig_pay, fig_sess = render_trend(filtered_data)
-    if fig_new: all_figs["New Players Trend"] = fig_new
-    if fig_pay: all_figs["Paying Players Trend"] = fig_pay
-    if fig_sess: all_figs["Session Trend"] = fig_sess
+    render_trend(filtered_data)
 
 elif section == "Correlation Analysis":
-    results_df, fig_corr, fig_scat, fig_box = render_correlation(filtered_data)
-    if fig_corr: all_figs["Correlation Heatmap"] = fig_corr
-    if fig_scat: all_figs["Correlation Scatter"] = fig_scat
-    if fig_box: all_figs["Correlation Boxplot"] = fig_box
+    pearson = segment_pearson(selected_region, genres, genders, purchase_filter)
+    render_correlation(filtered_data, pearson=pearson)
 
 elif section == "Cluster Analysis":
-    # Note: This is adapted to the new return value of clustering.py.
-    fig_cluster, cluster_summary = render_clustering(filtered_data)
-    if fig_cluster: all_figs["AI Cluster 3D Plot"] = fig_cluster
-    # cluster_summary 是 DataFrame，可以在报告中单独处理，这里暂不放入 figs
+    render_clustering(filtered_data)
 
 elif section == "Predictive Modeling":
-    # Note: This is adapted to the new return value of prediction.py.
-    acc, fig_churn_dist = render_prediction(filtered_data)
-    model_acc = acc
-    if fig_churn_dist: all_figs["Churn Risk Distribution"] = fig_churn_dist
+    top_risk = partial(segment_top_risk, filtered_data, selected_region, genres, genders, purchase_filter)
+    render_prediction(filtered_data, top_risk=top_risk, evaluation=load_model_evaluation())
 
 # =====================
 # 5. Report Export Logic
 # =====================
+# The full report (every selected module for the current filters) is built by a
+# background job, so the dashboard stays usable while it runs.
 st.sidebar.markdown("---")
 st.sidebar.header("📥 Export Report")
 
-# Let user choose charts
-if all_figs:
-    selected_charts = st.sidebar.multiselect(
-        "Select charts to include:",
-        list(all_figs.keys()),
-        default=list(all_figs.keys())
-    )
-
-    if st.sidebar.button("📄 Generate PDF Report"):
-        with st.spinner("Generating PDF..."):
-            pdf_data = export_full_report(metrics, results_df, all_figs, model_acc, selected_charts)
+report_modules = st.sidebar.multiselect(
+    "Select modules to include:",
+    list(REPORT_MODULES),
+    default=list(REPORT_MODULES)
+)
 
-        st.sidebar.success("Report Ready!")
-        st.sidebar.download_button(
+if st.sidebar.button("📄 Generate PDF Report", disabled=not report_modules):
+    segment = {
+        "data": filtered_data,
+        "region": selected_region,
+        "kpis": segment_kpis(selected_region, genres, genders, purchase_filter),
+        "hist": segment_retention(selected_region, genres, genders, purchase_filter),
+        "pearson": segment_pearson(selected_region, genres, genders, purchase_filter),
+        "evaluation": load_model_evaluation(),
+    }
+    st.session_state["report_job"] = ReportJob(segment, report_modules).start()
+    st.session_state["report_file"] = f"Game_Analytics_Report_{selected_region}.pdf"
+
+report_job = st.session_state.get("report_job")
+job_running = report_job is not None and not report_job.done
+
+
+@st.fragment(run_every=1.0 if job_running else None)
+def report_status():
+    job = st.session_state.get("report_job")
+    if job is None:
+        return
+    if not job.done:
+        st.progress(job.progress, text=job.stage)
+    elif job_running:
+        # Finished since the last full run: rerun once so the polling stops.
+        st.rerun()
+    elif job.error is not None:
+        st.error(f"Report failed: {job.error}")
+    else:
+        cached = sum(t["cached"] for t in job.render_timings.values())
+        st.success(f"Report Ready! ({job.elapsed:.1f}s, {len(job.render_timings)} charts, "
+                   f"{cached} from the image cache)")
+        st.download_button(
             label="⬇️ Download PDF",
-            data=pdf_data,
-            file_name=f"Game_Analytics_Report_{section}.pdf",
+            data=job.pdf,
+            file_name=st.session_state["report_file"],
             mime="application/pdf"
         )
-else:
-    st.sidebar.info("Navigate to a module to generate charts for export.")
\ No newline at end of file
+
+
+with st.sidebar:
+    report_status()
+
+# =====================
+# 6. Performance Panel
+# =====================
+# Wall time, rows in / out and (optionally) the tracemalloc peak of every stage this
+# run executed (not those of other sessions or of the background report job). Cached
+# stages return without running, so they do not appear.
+with st.sidebar.expander("⏱️ Performance"):
+    perf = instrumentation.settings()
+    st.checkbox("Record stage timings", value=perf["enabled"], key="perf_enabled")
+    st.checkbox("Trace peak memory (slower)", value=perf["memory"], key="perf_memory")
+    st.checkbox("Append to JSON-lines log", value=bool(perf["log_file"]), key="perf_log")
+    if perf["log_file"]:
+        st.caption(f"Log: {perf['log_file']}")
+
+    spans = instrumentation.records(since=run_mark, scope=perf_scope, thread_id=threading.get_ident())
+    if perf["enabled"] and spans.empty:
+        st.info("No stage ran this time (all served from the caches).")
+    elif not spans.empty:
+        st.dataframe(instrumentation.summary(spans), hide_index=True, use_container_width=True)
+        st.caption(f"{len(spans)} spans, {spans.loc[spans['parent'].isna(), 'wall_s'].sum():.3f}s at top level")
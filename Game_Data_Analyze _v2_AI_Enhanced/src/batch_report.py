@@ -0,0 +1,170 @@
+# @Author : Yulia
+# @File   : batch_report.py
+# @Time   : 2025/9/22
+
+"""
+Headless PDF reports for a grid of segments (Location x GameGenre), e.g. the weekly
+regional reports. Runs fully offline from the scored store.
+
+Usage (from the src folder):
+    python batch_report.py reports/ [--regions Asia USA] [--genres RPG Action] [--workers 4]
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import re
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import model_store
+import player_store
+from chart_images import warm_kaleido
+from columnar_cache import feather, write_frame
+from data_loader import CLEAN_FILE
+from report_export import export_full_report
+from report_job import REPORT_MODULES, collect_report
+from schema import apply_schema
+
+REPORT_WORKERS = int(os.environ.get("BATCH_REPORT_WORKERS", 0)) or os.cpu_count() or 1
+SNAPSHOT_NAME = "_segments.arrow"
+MANIFEST_NAME = "manifest.json"
+
+# Memory-mapped snapshot of the scored players, opened once per worker process.
+_table = None
+
+
+def write_snapshot(df, path):
+    """
+    Write the scored players sorted by (Location, GameGenre) as one uncompressed
+    Arrow file and return the row range of every segment: (region, genre) ->
+    (offset, length). Within a segment rows keep their JoinDay order.
+    """
+    df = df.sort_values(["Location", "GameGenre"], kind="stable").reset_index(drop=True)
+    write_frame(df, path)
+    sizes = df.groupby(["Location", "GameGenre"], observed=True, sort=False).size()
+    offsets = sizes.cumsum() - sizes
+    return {key: (int(offsets[key]), int(sizes[key])) for key in sizes.index}
+
+
+def _open_snapshot(path):
+    global _table
+    _table = feather.read_table(path, memory_map=True)
+    warm_kaleido()
+
+
+def _segment_file(region, genre):
+    safe = re.sub(r"[^0-9A-Za-z_-]+", "_", f"{region}_{genre}")
+    return f"report_{safe}.pdf"
+
+
+def build_report(region, genre, offset, length, out_dir, modules, evaluation=None):
+    """
+    Worker task: slice the segment out of the memory-mapped snapshot (no copy of the
+    other rows), run the modules headlessly and write its PDF.
+    """
+    start = time.perf_counter()
+    entry = {"region": region, "genre": genre, "rows": length, "file": _segment_file(region, genre)}
+    try:
+        data = apply_schema(_table.slice(offset, length).to_pandas())
+        data.attrs["region"] = region
+        report = collect_report({"data": data, "region": region, "evaluation": evaluation}, modules, workers=1)
+        render_timings = {}
+        buffer = export_full_report(report["metrics"], report["results_df"], report["figs"], report["model_acc"],
+                                    list(report["figs"]), timings=render_timings,
+                                    subtitle=f"Region: {region} | Game Type: {genre} | Players: {length}",
+                                    render_workers=1, evaluation=report["evaluation"])
+        with open(os.path.join(out_dir, entry["file"]), "wb") as f:
+            f.write(buffer.getvalue())
+        entry.update(modules_s=report["timings"],
+                     render_s={title: t["render_s"] for title, t in render_timings.items()},
+                     cached_images=sum(t["cached"] for t in render_timings.values()), error=None)
+    except Exception as e:
+        message = str(e).strip().splitlines()
+        entry.update(file=None, error=f"{type(e).__name__}: {message[0] if message else ''}")
+    entry["seconds"] = time.perf_counter() - start
+    return entry
+
+
+def run_batch(out_dir, regions=None, genres=None, modules=None, workers=None):
+    """
+    Build one report per (region, genre) of the grid (all stored values when None)
+    on a process pool and write manifest.json with per-report timings.
+    Returns the manifest.
+    """
+    if feather is None:
+        raise RuntimeError("pyarrow is required for batch reports.")
+    start = time.perf_counter()
+    workers = workers or REPORT_WORKERS
+    modules = list(modules or REPORT_MODULES)
+    os.makedirs(out_dir, exist_ok=True)
+
+    # The scored store is loaded once here; workers share it through the snapshot.
+    meta = player_store.ensure_scored(CLEAN_FILE)
+    data = player_store.load_scored(CLEAN_FILE)
+    if data is None:
+        data = player_store.build_scored(CLEAN_FILE)
+    models = model_store.load_models(meta["model_key"]) if meta else None
+    evaluation = player_store.model_evaluation(CLEAN_FILE, models) if models is not None else None
+    snapshot = os.path.join(out_dir, SNAPSHOT_NAME)
+    segments = write_snapshot(data, snapshot)
+    load_s = time.perf_counter() - start
+
+    regions = regions or sorted({r for r, _ in segments})
+    genres = genres or sorted({g for _, g in segments})
+    grid = [(r, g) for r in regions for g in genres]
+
+    entries = [{"region": r, "genre": g, "rows": 0, "file": None, "error": "no players in this segment",
+                "seconds": 0.0} for r, g in grid if (r, g) not in segments]
+    tasks = [(r, g, *segments[(r, g)]) for r, g in grid if (r, g) in segments]
+    try:
+        with ProcessPoolExecutor(min(workers, max(len(tasks), 1)), mp_context=mp.get_context("spawn"),
+                                 initializer=_open_snapshot, initargs=(snapshot,)) as pool:
+            futures = [pool.submit(build_report, *task, out_dir, modules, evaluation) for task in tasks]
+            for future in as_completed(futures):
+                entry = future.result()
+                entries.append(entry)
+                status = entry["error"] or entry["file"]
+                print(f"[{len(entries)}/{len(grid)}] {entry['region']} / {entry['genre']}: "
+                      f"{entry['seconds']:.1f}s -> {status}")
+    finally:
+        os.remove(snapshot)
+
+    order = {key: i for i, key in enumerate(grid)}
+    entries.sort(key=lambda e: order[(e["region"], e["genre"])])
+    manifest = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "source": os.path.basename(CLEAN_FILE),
+        "modules": modules,
+        "workers": workers,
+        "load_s": load_s,
+        "total_s": time.perf_counter() - start,
+        "reports": entries,
+    }
+    with open(os.path.join(out_dir, MANIFEST_NAME), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, ensure_ascii=False)
+    return manifest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate PDF reports for every region x game type segment.")
+    parser.add_argument("output_dir", help="Folder for the PDFs and manifest.json")
+    parser.add_argument("--regions", nargs="+", help="Regions to include (default: all)")
+    parser.add_argument("--genres", nargs="+", help="Game types to include (default: all)")
+    parser.add_argument("--modules", nargs="+", choices=list(REPORT_MODULES), metavar="MODULE",
+                        help="Report modules to include (default: all)")
+    parser.add_argument("--workers", type=int, default=REPORT_WORKERS, help="Worker processes")
+    args = parser.parse_args(argv)
+
+    manifest = run_batch(args.output_dir, args.regions, args.genres, args.modules, args.workers)
+    failed = [e for e in manifest["reports"] if e["error"]]
+    print(f"{len(manifest['reports']) - len(failed)} reports in {manifest['total_s']:.1f}s "
+          f"({len(failed)} failed or empty) -> {os.path.join(args.output_dir, MANIFEST_NAME)}")
+    if failed and len(failed) == len(manifest["reports"]):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
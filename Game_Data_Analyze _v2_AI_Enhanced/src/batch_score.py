@@ -0,0 +1,120 @@
+# @Author : Yulia
+# @File   : batch_score.py
+# @Time   : 2025/9/12
+
+"""
+Headless churn / persona scoring for CRM syncs.
+
+Usage (from the src folder):
+    python batch_score.py players.csv scores.parquet [--chunk-rows 200000] [--model-key KEY]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+import model_store
+from ai_pipeline import score_players
+from schema import PIPELINE_COLUMNS
+
+SCORE_COLUMNS = ["Cluster", "Persona", "Churn_Prob", "Risk_Level"]
+DEFAULT_CHUNK_ROWS = 200_000
+
+
+def iter_chunks(path, chunk_rows):
+    """
+    Yield DataFrame chunks of a CSV or Parquet file, reading only the pipeline columns.
+    """
+    if path.endswith(".parquet"):
+        import pyarrow.parquet as pq
+
+        pf = pq.ParquetFile(path)
+        columns = [c for c in pf.schema_arrow.names if c in PIPELINE_COLUMNS]
+        for batch in pf.iter_batches(batch_size=chunk_rows, columns=columns):
+            yield batch.to_pandas()
+    else:
+        yield from pd.read_csv(path, chunksize=chunk_rows, usecols=lambda c: c in PIPELINE_COLUMNS)
+
+
+class ScoreWriter:
+    """
+    Appends scored chunks to a CSV or Parquet file (format taken from the extension).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        self._parquet = None
+
+    def write(self, chunk):
+        # Plain strings keep the file schema identical across chunks.
+        chunk = chunk.astype({c: str for c in ["Persona", "Risk_Level"] if c in chunk.columns})
+        if self.path.endswith(".parquet"):
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+
+            table = pa.Table.from_pandas(chunk, preserve_index=False)
+            if self._parquet is None:
+                self._parquet = pq.ParquetWriter(self.path, table.schema)
+            self._parquet.write_table(table.cast(self._parquet.schema))
+        else:
+            chunk.to_csv(self.path, mode="a" if self.rows else "w", header=not self.rows, index=False)
+        self.rows += len(chunk)
+
+    def close(self):
+        if self._parquet is not None:
+            self._parquet.close()
+
+
+def score_file(input_path, output_path, models, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Stream `input_path` through the stored scaler, K-Means, persona mapping and churn
+    model, writing PlayerID (when present) plus the score columns to `output_path`.
+
+    Returns a dict with the rows scored, elapsed seconds and rows/sec.
+    """
+    start = time.perf_counter()
+    writer = ScoreWriter(output_path)
+    try:
+        for chunk in iter_chunks(input_path, chunk_rows):
+            scored = score_players(chunk, models)
+            keep = [c for c in ["PlayerID"] + SCORE_COLUMNS if c in scored.columns]
+            writer.write(scored[keep])
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    return {"rows": writer.rows, "seconds": elapsed,
+            "rows_per_sec": writer.rows / elapsed if elapsed > 0 else float("inf")}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Score players for churn risk and persona without the dashboard.")
+    parser.add_argument("input", help="Input CSV or Parquet file with raw player columns")
+    parser.add_argument("output", help="Output CSV or Parquet file")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS, help="Rows per chunk")
+    parser.add_argument("--model-key", help="Artifact key to score with (default: models of the current dataset)")
+    args = parser.parse_args(argv)
+
+    if args.model_key:
+        models = model_store.load_models(args.model_key)
+    else:
+        import player_store
+        from data_loader import CLEAN_FILE
+
+        meta = player_store.ensure_scored(CLEAN_FILE)
+        models = model_store.load_models(meta["model_key"]) if meta else None
+    if models is None:
+        sys.exit("No stored models found. Run the dashboard or load_data() once to train them.")
+
+    if os.path.exists(args.output):
+        os.remove(args.output)
+    stats = score_file(args.input, args.output, models, args.chunk_rows)
+    print(f"Scored {stats['rows']} players in {stats['seconds']:.2f}s ({stats['rows_per_sec']:,.0f} rows/sec) -> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,292 @@
+# @Author : Yulia
+# @File   : benchmark.py
+# @Time   : 2025/9/24
+
+"""
+Benchmark suite for the data and analytics hot paths: every stage is run headlessly
+(render=False, no Streamlit server, no network) at several dataset sizes, and wall
+time, peak traced memory and rows/sec are written to a JSON results file. Besides
+the warm load of the scored store, the AI pipeline is timed on its own (training,
+scoring) and cold (CSV -> trained, scored store, with no cached model or store). With a
+baseline file, stages that got slower (or hungrier) than the tolerance are flagged
+and the exit code is 1.
+
+Usage (from the src folder):
+    python benchmark.py [--sizes 40000 1000000] [--stages load_data filter_data]
+                        [--output benchmark_results.json] [--baseline baseline.json] [--save-baseline]
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+import chart_images
+import model_store
+import player_store
+from ai_pipeline import score_players, train_models
+from columnar_cache import cache_dir_for
+from data_loader import CLEAN_FILE, filter_data
+from filter_index import FilterIndex
+from overview import render_overview
+from retention import render_retention_funnel
+from simulation_trend import render_trend
+from correlation import render_correlation
+from clustering import render_clustering
+from prediction import render_prediction
+from report_export import export_full_report
+from report_job import collect_report
+from schema import PIPELINE_COLUMNS
+
+
+SIZES = (40_000, 1_000_000, 10_000_000)
+REPEAT = 3
+
+# A stage regresses when its median wall time (or peak memory) exceeds the baseline
+# by more than TOLERANCE; differences below the noise floors are never flagged.
+TOLERANCE = 0.25
+NOISE_FLOOR_S = 0.05
+NOISE_FLOOR_MB = 8.0
+
+# Representative sidebar selection for the filter stages.
+FILTERS = {"selected_region": "Global", "genres": ["Action", "RPG"], "genders": ["Female"],
+           "purchase_filter": "Paid players"}
+
+
+def scale_players(df, size):
+    """
+    `size` players made by repeating the scored rows, with unique PlayerIDs, so every
+    size keeps the real value distributions.
+    """
+    data = df.iloc[np.arange(size) % len(df)].reset_index(drop=True)
+    if "PlayerID" in data.columns:
+        data["PlayerID"] = np.arange(size, dtype=np.int64)
+    return data
+
+
+@contextlib.contextmanager
+def scratch_store(directory):
+    """
+    Point the scored store (player_store), the model artifacts (model_store) and the
+    chart image cache at `directory`, so the load, build and export stages run on the
+    benchmark data and the real caches are left untouched.
+    """
+    saved = (player_store.STORE_DIR, player_store.META_FILE, player_store.CORR_STATS_FILE, model_store.MODEL_DIR,
+             chart_images.IMAGE_DIR)
+    player_store.STORE_DIR = os.path.join(directory, "scored")
+    player_store.META_FILE = os.path.join(player_store.STORE_DIR, "players_scored.json")
+    player_store.CORR_STATS_FILE = os.path.join(player_store.STORE_DIR, "correlation_stats.joblib")
+    model_store.MODEL_DIR = os.path.join(directory, "models")
+    chart_images.IMAGE_DIR = os.path.join(directory, "images")
+    try:
+        yield
+    finally:
+        (player_store.STORE_DIR, player_store.META_FILE, player_store.CORR_STATS_FILE, model_store.MODEL_DIR,
+         chart_images.IMAGE_DIR) = saved
+
+
+def _write_store(data, directory):
+    # The store is keyed by the fingerprint of its source file: a placeholder stands in.
+    source = os.path.join(directory, "players.csv")
+    with open(source, "w", encoding="utf-8") as f:
+        f.write(f"{len(data)} benchmark players\n")
+    os.makedirs(player_store.STORE_DIR, exist_ok=True)
+    player_store.save_scored(data, source, {"key": None}, stats={})
+    return source
+
+
+def _load_data(source):
+    # What data_loader.load_data("Global") does once the scored store is current.
+    df = player_store.load_scored(source)
+    df.attrs["region"] = "Global"
+    return df
+
+
+def _write_source(data):
+    # The raw player columns as a CSV next to the scratch store, for the cold build.
+    source = os.path.join(os.path.dirname(player_store.STORE_DIR), "players_raw.csv")
+    data[[c for c in PIPELINE_COLUMNS if c in data.columns]].to_csv(source, index=False)
+    return source
+
+
+def _build_cold(source):
+    # What the first load_data() after a data or pipeline change does: nothing cached
+    # (no model artifact, scored store or Arrow copy of the CSV), so the CSV parse,
+    # the fingerprint miss, training, cross-validation, scoring and the store write
+    # are all timed.
+    for directory in (model_store.MODEL_DIR, player_store.STORE_DIR, cache_dir_for(source)):
+        shutil.rmtree(directory, ignore_errors=True)
+    return player_store.build_scored(source)
+
+
+def _export(report):
+    chart_images.shutdown_pool()
+    shutil.rmtree(chart_images.IMAGE_DIR, ignore_errors=True)  # cold image cache every run
+    return export_full_report(report["metrics"], report["results_df"], report["figs"], report["model_acc"],
+                              list(report["figs"]))
+
+
+# Stage name -> (setup(data, source) -> args, fn(*args)). Only fn is measured.
+STAGES = {
+    "load_data": (lambda data, source: (source,), _load_data),
+    "filter_data": (lambda data, source: (data,),
+                    lambda df: filter_data(df, **FILTERS)),
+    "filter_data_indexed": (lambda data, source: (data, FilterIndex(data)),
+                            lambda df, index: filter_data(df, **FILTERS, index=index)),
+    "render_overview": (lambda data, source: (data,), lambda df: render_overview(df, "Global", render=False)),
+    "render_retention_funnel": (lambda data, source: (data,), lambda df: render_retention_funnel(df, render=False)),
+    "render_trend": (lambda data, source: (data,), lambda df: render_trend(df, render=False)),
+    "render_correlation": (lambda data, source: (data,), lambda df: render_correlation(df, render=False)),
+    "render_clustering": (lambda data, source: (data,), lambda df: render_clustering(df, render=False)),
+    "render_prediction": (lambda data, source: (data,), lambda df: render_prediction(df, render=False)),
+    "export_full_report": (lambda data, source: (collect_report({"data": data, "region": "Global"}, workers=1),),
+                           _export),
+    "train_models": (lambda data, source: (data,), train_models),
+    # Scores a copy: score_players writes its columns into the frame it is given.
+    "score_players": (lambda data, source: (data.copy(), train_models(data)), score_players),
+    "build_scored_cold": (lambda data, source: (_write_source(data),), _build_cold),
+}
+
+
+def measure(fn, args, repeat=REPEAT, memory=True):
+    """
+    Median / min wall time of `repeat` calls, then the peak traced memory of one more
+    call (tracemalloc slows Python-level code, so it is kept out of the timed runs).
+    Allocations outside the Python allocators (e.g. Arrow buffers) are not traced.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(*args)
+        times.append(time.perf_counter() - start)
+
+    peak_mb = None
+    if memory:
+        tracemalloc.start()
+        try:
+            fn(*args)
+            peak_mb = tracemalloc.get_traced_memory()[1] / 2 ** 20
+        finally:
+            tracemalloc.stop()
+    return {"wall_s": statistics.median(times), "wall_s_min": min(times), "peak_mb": peak_mb}
+
+
+def run_suite(base, sizes=SIZES, stages=None, repeat=REPEAT, memory=True, log=print):
+    """
+    Run `stages` (all when None) at every size on players scaled from `base`.
+    Returns the results document written by main().
+    """
+    stages = list(stages or STAGES)
+    results = []
+    for size in sizes:
+        data = scale_players(base, size)
+        with tempfile.TemporaryDirectory(prefix="benchmark-") as directory, scratch_store(directory):
+            source = _write_store(data, directory) if "load_data" in stages else None
+            for name in stages:
+                setup, fn = STAGES[name]
+                entry = {"stage": name, "rows": size, "wall_s": None, "wall_s_min": None, "peak_mb": None,
+                         "rows_per_s": None, "error": None}
+                try:
+                    entry.update(measure(fn, setup(data, source), repeat, memory))
+                    entry["rows_per_s"] = size / entry["wall_s"] if entry["wall_s"] > 0 else None
+                except Exception as e:
+                    message = str(e).strip().splitlines()
+                    entry["error"] = f"{type(e).__name__}: {message[0] if message else ''}"
+                results.append(entry)
+                log(_format_entry(entry))
+        del data
+    chart_images.shutdown_pool()
+
+    return {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "environment": {"python": platform.python_version(), "platform": platform.platform(),
+                        "cpu_count": os.cpu_count(), "numpy": np.__version__, "pandas": pd.__version__},
+        "repeat": repeat,
+        "results": results,
+    }
+
+
+def _format_entry(entry):
+    if entry["error"]:
+        return f"{entry['stage']:<24} {entry['rows']:>11,} rows  ERROR {entry['error']}"
+    memory = f"{entry['peak_mb']:9.1f} MB" if entry["peak_mb"] is not None else "         -"
+    return (f"{entry['stage']:<24} {entry['rows']:>11,} rows  {entry['wall_s']:9.4f} s  {memory}  "
+            f"{entry['rows_per_s']:>14,.0f} rows/s")
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """
+    Regressions of `results` against `baseline` (both results documents), matched by
+    (stage, rows): one dict per metric that grew by more than `tolerance`.
+    """
+    previous = {(e["stage"], e["rows"]): e for e in baseline["results"] if not e["error"]}
+    regressions = []
+    for entry in results["results"]:
+        old = previous.get((entry["stage"], entry["rows"]))
+        if old is None or entry["error"]:
+            continue
+        for metric, floor in (("wall_s", NOISE_FLOOR_S), ("peak_mb", NOISE_FLOOR_MB)):
+            new_value, old_value = entry[metric], old[metric]
+            if new_value is None or old_value is None:
+                continue
+            if new_value > old_value * (1 + tolerance) and new_value - old_value > floor:
+                regressions.append({"stage": entry["stage"], "rows": entry["rows"], "metric": metric,
+                                    "baseline": old_value, "current": new_value,
+                                    "ratio": new_value / old_value if old_value else None})
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the data and analytics stages at several sizes.")
+    parser.add_argument("--sizes", nargs="+", type=int, default=list(SIZES), help="Dataset sizes (rows)")
+    parser.add_argument("--stages", nargs="+", choices=list(STAGES), metavar="STAGE",
+                        help="Stages to run (default: all)")
+    parser.add_argument("--repeat", type=int, default=REPEAT, help="Timed runs per stage and size")
+    parser.add_argument("--no-memory", action="store_true", help="Skip the tracemalloc run")
+    parser.add_argument("--output", default="benchmark_results.json", help="Results file (JSON)")
+    parser.add_argument("--baseline", help="Baseline results file to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Also write the results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="Allowed slowdown (0.25 = +25%%)")
+    args = parser.parse_args(argv)
+
+    player_store.ensure_scored(CLEAN_FILE)
+    base = player_store.load_scored(CLEAN_FILE)
+    if base is None:
+        base = player_store.build_scored(CLEAN_FILE)
+
+    results = run_suite(base, args.sizes, args.stages, args.repeat, not args.no_memory)
+
+    regressions = []
+    if args.baseline and os.path.exists(args.baseline) and not args.save_baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        results["baseline"] = os.path.abspath(args.baseline)
+        results["regressions"] = regressions
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    if args.save_baseline and args.baseline:
+        shutil.copyfile(args.output, args.baseline)
+        print(f"Baseline saved -> {args.baseline}")
+
+    for r in regressions:
+        unit = "s" if r["metric"] == "wall_s" else " MB"
+        print(f"REGRESSION {r['stage']} @ {r['rows']:,} rows: {r['metric']} "
+              f"{r['baseline']:.3f}{unit} -> {r['current']:.3f}{unit} ({r['ratio']:.2f}x)")
+    print(f"{len(results['results'])} measurements, {len(regressions)} regressions -> {args.output}")
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
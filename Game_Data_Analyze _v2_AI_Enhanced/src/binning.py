@@ -0,0 +1,99 @@
+# @Author : Yulia
+# @File   : binning.py
+# @Time   : 2025/9/16
+
+import numpy as np
+import pandas as pd
+
+
+def category_counts(series):
+    """
+    Row count per value, via np.bincount on categorical codes (observed values only).
+    """
+    cat = series if isinstance(series.dtype, pd.CategoricalDtype) else series.astype("category")
+    codes = cat.cat.codes.to_numpy()
+    counts = np.bincount(codes[codes >= 0], minlength=len(cat.cat.categories))
+    observed = counts > 0
+    return pd.DataFrame({series.name: np.asarray(cat.cat.categories)[observed], "count": counts[observed]})
+
+
+def integer_counts(series):
+    """
+    Row count per integer value (one bar per value), via np.bincount.
+    """
+    values = series.dropna().to_numpy().astype(np.int64)
+    if len(values) == 0:
+        return pd.DataFrame({series.name: [], "count": []})
+    low = values.min()
+    counts = np.bincount(values - low)
+    observed = counts > 0
+    return pd.DataFrame({series.name: np.arange(low, low + len(counts))[observed], "count": counts[observed]})
+
+
+def histogram_bins(series, nbins):
+    """
+    Counts of `nbins` equal-width bins; returns bin centers, widths and counts.
+    Integer data gets integer-aligned bins so no bar straddles a value.
+    """
+    values = series.dropna().to_numpy()
+    if len(values) == 0:
+        return pd.DataFrame({series.name: [], "width": [], "count": []})
+    low, high = values.min(), values.max()
+    if pd.api.types.is_integer_dtype(series):
+        width = max(1, int(np.ceil((high - low + 1) / nbins)))
+        edges = np.arange(low - 0.5, high + width, width)
+    else:
+        edges = np.histogram_bin_edges(values, bins=nbins)
+    counts, edges = np.histogram(values, bins=edges)
+    return pd.DataFrame({series.name: (edges[:-1] + edges[1:]) / 2, "width": np.diff(edges), "count": counts})
+
+
+def grouped_counts(df, x, color):
+    """
+    Row count per (x, color) pair, with `color` as text so Plotly treats it as discrete.
+    """
+    counts = df.groupby([x, color], observed=True).size().reset_index(name="count")
+    counts[color] = counts[color].astype(str)
+    return counts
+
+
+def benchmark_overview_payload(df, selected_region="Global"):
+    """
+    Figure JSON size and build time of the Overview charts: row-level px.histogram /
+    px.pie (the previous implementation) against the pre-binned charts.
+    """
+    import time
+    import plotly.express as px
+    from overview import render_overview
+
+    def row_level_figures():
+        return [
+            px.histogram(df, x="Location", title=f"Geography ({selected_region})", text_auto=True),
+            px.histogram(df, x="Age", nbins=20, title="Age Distribution"),
+            px.pie(df, names="Gender", title="Gender Distribution"),
+            px.histogram(df, x="SessionsPerWeek", title="Weekly Sessions Distribution"),
+            px.pie(df, names="EngagementLevel", title="Engagement Level"),
+            px.histogram(df, x="PlayerLevel", color="InGamePurchases", barmode="group", title="Paying Players by Level"),
+            px.histogram(df, x="GameGenre", color="InGamePurchases", barmode="group", title="Paying Players by Game Type"),
+        ]
+
+    def binned_figures():
+        return list(render_overview(df, selected_region, render=False)[1].values())
+
+    results = {}
+    for name, build in [("row_level", row_level_figures), ("binned", binned_figures)]:
+        start = time.perf_counter()
+        payload = sum(len(fig.to_json()) for fig in build())
+        results[name] = {"payload_bytes": payload, "build_and_serialize_s": time.perf_counter() - start}
+    return results
+
+
+if __name__ == "__main__":
+    from data_loader import load_data
+
+    data = load_data()
+    for size in [len(data), 1_000_000]:
+        sample = data.iloc[np.arange(size) % len(data)].reset_index(drop=True)
+        for name, res in benchmark_overview_payload(sample).items():
+            print(f"{size} rows | {name:9s}: {res['payload_bytes'] / 1024:10.1f} KiB, "
+                  f"{res['build_and_serialize_s'] * 1000:8.1f} ms")
@@ -0,0 +1,146 @@
+# @Author : Yulia
+# @File   : chart_images.py
+# @Time   : 2025/9/20
+
+import atexit
+import hashlib
+import json
+import multiprocessing as mp
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import plotly
+
+
+IMAGE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', '.cache', 'images')
+
+# Rasterization processes (REPORT_RENDER_WORKERS overrides it). Each keeps its own
+# Kaleido / Chrome instance running between figures and between reports.
+RENDER_WORKERS = int(os.environ.get("REPORT_RENDER_WORKERS", 0)) or min(4, os.cpu_count() or 1)
+
+# Passed to fig.to_image; the figure's own layout decides the size, as before.
+IMAGE_OPTIONS = {"format": "png"}
+
+_pool = None
+_pool_workers = 0
+_pool_lock = threading.Lock()
+
+
+def figure_key(spec, options=IMAGE_OPTIONS):
+    """
+    Content hash of a figure spec (its JSON) and the image options. The plotly
+    version is part of the key because it changes how a spec is drawn.
+    """
+    h = hashlib.sha1(spec.encode("utf-8"))
+    h.update(json.dumps({"options": options, "plotly": plotly.__version__}, sort_keys=True).encode("utf-8"))
+    return h.hexdigest()[:20]
+
+
+def _image_path(key):
+    return os.path.join(IMAGE_DIR, f"{key}.png")
+
+
+def warm_kaleido():
+    """
+    Pool initializer: start a persistent Kaleido server in the worker, so every
+    figure it renders reuses the same browser (kaleido >= 1.1; older versions keep
+    their subprocess alive on their own). MathJax is not loaded (no chart uses it),
+    so rendering needs no network access: plotly.js comes from the plotly package.
+    """
+    import kaleido
+    import plotly.graph_objects as go
+
+    if not hasattr(kaleido, "start_sync_server"):
+        return
+    try:
+        # A one-shot render first: without a usable browser the server thread would
+        # die and later calls wait on it forever, so it is only started once this works.
+        kaleido.calc_fig_sync(go.Figure(), opts={"format": "png"}, kopts={"mathjax": False})
+    except Exception:
+        return
+    kaleido.start_sync_server(mathjax=False, silence_warnings=True)
+
+
+def _render(spec, options):
+    import plotly.io as pio
+
+    start = time.perf_counter()
+    image = pio.from_json(spec).to_image(**options)
+    return image, time.perf_counter() - start
+
+
+def _get_pool(workers):
+    global _pool, _pool_workers
+    with _pool_lock:
+        if _pool is None or _pool_workers != workers:
+            if _pool is not None:
+                _pool.shutdown(wait=False)
+            _pool = ProcessPoolExecutor(workers, mp_context=mp.get_context("spawn"), initializer=warm_kaleido)
+            _pool_workers = workers
+        return _pool
+
+
+def shutdown_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=True)
+            _pool = None
+
+
+atexit.register(shutdown_pool)
+
+
+def render_images(figs, options=IMAGE_OPTIONS, workers=None):
+    """
+    PNG bytes for every figure of `figs` (title -> figure), plus per-figure timings.
+
+    Images are cached in data/.cache/images under the content hash of the figure
+    spec, so unchanged charts are never rasterized twice. The remaining figures are
+    rendered in parallel on a persistent process pool.
+
+    Returns (images, timings): title -> bytes and title -> {"cached", "render_s"}.
+    """
+    workers = workers or RENDER_WORKERS
+    images, timings, pending = {}, {}, {}
+    for title, fig in figs.items():
+        spec = fig.to_json()
+        key = figure_key(spec, options)
+        path = _image_path(key)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                images[title] = f.read()
+            timings[title] = {"cached": True, "render_s": 0.0}
+        else:
+            pending[title] = (key, spec)
+
+    if pending:
+        if workers > 1 and len(pending) > 1:
+            pool = _get_pool(workers)
+            try:
+                futures = {title: pool.submit(_render, spec, options) for title, (_, spec) in pending.items()}
+                results = {title: future.result() for title, future in futures.items()}
+            except BrokenProcessPool:
+                # A worker died (e.g. its browser crashed): start a fresh pool next time.
+                shutdown_pool()
+                raise
+        else:
+            results = {title: _render(spec, options) for title, (_, spec) in pending.items()}
+
+        for title, (image, seconds) in results.items():
+            images[title] = image
+            timings[title] = {"cached": False, "render_s": seconds}
+            try:
+                os.makedirs(IMAGE_DIR, exist_ok=True)
+                path = _image_path(pending[title][0])
+                with open(path + ".tmp", "wb") as f:
+                    f.write(image)
+                os.replace(path + ".tmp", path)
+            except OSError:
+                # Read-only data directory: the report still gets its images.
+                pass
+
+    return {title: images[title] for title in figs}, {title: timings[title] for title in figs}
@@ -4,19 +4,57 @@
 
 import streamlit as st
 import plotly.express as px
+import plotly.graph_objects as go
 import pandas as pd
+import numpy as np
 
+from instrumentation import traced
 
-def render_clustering(filtered_data, render=True):
+
+# Maximum number of players drawn in the 3D scatter (level of detail).
+POINT_BUDGET = 5000
+# Every persona keeps at least this many points, so small segments stay visible.
+MIN_POINTS_PER_PERSONA = 100
+
+
+def lod_sample(df, budget=POINT_BUDGET, by="Persona", seed=42):
+    """
+    Level-of-detail sample for the 3D scatter: stratified by persona with each
+    persona keeping its share of the budget (at least MIN_POINTS_PER_PERSONA),
+    and a uniform random draw inside each persona so point density is preserved.
+    The seed keeps the sample stable across reruns.
+    """
+    if len(df) <= budget:
+        return df
+
+    codes, uniques = pd.factorize(df[by])
+    counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+    quota = np.minimum(counts, np.maximum(np.floor(budget * counts / counts.sum()), MIN_POINTS_PER_PERSONA))
+
+    rng = np.random.default_rng(seed)
+    rank = pd.Series(rng.random(len(df))).groupby(codes).rank(method="first").to_numpy()
+    keep = (codes >= 0) & (rank <= quota[np.maximum(codes, 0)])
+    return df[keep]
+
+
+@traced()
+def render_clustering(filtered_data, render=True, point_budget=POINT_BUDGET):
     # Check if AI data exists
     if "Persona" not in filtered_data.columns:
         if render:
             st.warning("⚠️ AI Persona data missing. Please check data_loader.")
         return None, None
 
-    # 1. 3D scatter plot (using AI-generated Persona coloring)
+    # 1. Calculate the mean of each Persona (full data, not the plotted sample).
+    # Average only the numerical column
+    numeric_cols = ["Age", "SessionsPerWeek", "PlayerLevel", "InGamePurchases"]
+    persona_means = filtered_data.groupby("Persona", observed=True)[numeric_cols].mean()
+    cluster_summary = persona_means.round(2)
+
+    # 2. 3D scatter plot (using AI-generated Persona coloring) over a level-of-detail sample
+    plot_data = lod_sample(filtered_data, point_budget)
     fig_cluster = px.scatter_3d(
-        filtered_data,
+        plot_data,
         x="Age",
         y="SessionsPerWeek",
         z="PlayerLevel",
@@ -25,11 +63,15 @@ def render_clustering(filtered_data, render=True):
         title="🤖 AI-Driven Player Segmentation (5 Personas)",
         color_discrete_sequence=px.colors.qualitative.Bold
     )
+    fig_cluster.update_traces(marker=dict(size=3))
 
-    # 2. Calculate the mean of each Persona.
-    # Average only the numerical column
-    numeric_cols = ["Age", "SessionsPerWeek", "PlayerLevel", "InGamePurchases"]
-    cluster_summary = filtered_data.groupby("Persona")[numeric_cols].mean().round(2)
+    # Persona centroids on top of the sample
+    fig_cluster.add_trace(go.Scatter3d(
+        x=persona_means["Age"], y=persona_means["SessionsPerWeek"], z=persona_means["PlayerLevel"],
+        mode="markers", name="Centroids", text=persona_means.index.astype(str),
+        hovertemplate="%{text}<br>Age %{x:.1f} | Sessions %{y:.1f} | Level %{z:.1f}<extra>Centroid</extra>",
+        marker=dict(size=9, symbol="diamond", color="black", line=dict(color="white", width=1))
+    ))
 
     if render:
         st.subheader("🧩 AI-Enhanced Player Segmentation")
@@ -41,10 +83,17 @@ def render_clustering(filtered_data, render=True):
         col1, col2 = st.columns([3, 1])
         with col1:
             st.plotly_chart(fig_cluster, use_container_width=True)
+            if len(plot_data) < len(filtered_data):
+                st.caption(f"Showing a stratified sample of {len(plot_data):,} of {len(filtered_data):,} players "
+                           f"(per-persona share preserved); ◆ marks each persona centroid.")
+            else:
+                st.caption(f"Showing all {len(filtered_data):,} players; ◆ marks each persona centroid.")
         with col2:
             st.write("**Persona Distribution**")
             counts = filtered_data["Persona"].value_counts().reset_index()
             counts.columns = ["Persona", "Count"]
+            # Categorical value_counts also lists personas absent from this segment.
+            counts = counts[counts["Count"] > 0]
             fig_pie = px.pie(counts, values="Count", names="Persona", hole=0.4)
             fig_pie.update_layout(showlegend=False, margin=dict(t=0, b=0, l=0, r=0))
             st.plotly_chart(fig_pie, use_container_width=True)
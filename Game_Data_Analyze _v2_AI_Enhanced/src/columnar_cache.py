@@ -0,0 +1,131 @@
+# @Author : Yulia
+# @File   : columnar_cache.py
+# @Time   : 2025/9/8
+
+import glob
+import hashlib
+import os
+import time
+
+import pandas as pd
+
+from instrumentation import traced
+
+try:
+    import pyarrow.feather as feather
+except ImportError:  # The cache is an accelerator only; fall back to plain CSV parsing.
+    feather = None
+
+
+CACHE_DIR_NAME = ".cache"
+
+
+def file_fingerprint(path):
+    """
+    Cheap fingerprint of a source file (name, size, modification time).
+    Any rewrite of the CSV changes it and invalidates the cached copy.
+    """
+    stat = os.stat(path)
+    key = f"{os.path.basename(path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+def cache_dir_for(path):
+    """
+    Cache directory that sits next to the source file (data/.cache).
+    """
+    return os.path.join(os.path.dirname(os.path.abspath(path)), CACHE_DIR_NAME)
+
+
+def _cache_path(csv_path):
+    stem = os.path.splitext(os.path.basename(csv_path))[0]
+    return os.path.join(cache_dir_for(csv_path), f"{stem}-{file_fingerprint(csv_path)}.arrow")
+
+
+def _drop_stale(csv_path, keep):
+    stem = os.path.splitext(os.path.basename(csv_path))[0]
+    for old in glob.glob(os.path.join(cache_dir_for(csv_path), f"{stem}-*.arrow")):
+        if old != keep:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+
+
+def write_frame(df, path):
+    """
+    Atomically write a frame as an uncompressed (memory-mappable) Arrow IPC file.
+    """
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    feather.write_feather(df, tmp_path, compression="uncompressed")
+    os.replace(tmp_path, path)
+
+
+def read_frame(path, columns=None):
+    """
+    Memory-map an Arrow IPC file and materialize only `columns` (all when None).
+    """
+    if columns is not None:
+        available = feather.read_table(path, memory_map=True).column_names
+        columns = [c for c in available if c in columns]
+    return feather.read_table(path, columns=columns, memory_map=True).to_pandas()
+
+
+@traced()
+def read_csv_cached(csv_path, columns=None):
+    """
+    Read a CSV through an Arrow IPC (Feather v2) cache stored in data/.cache.
+
+    The first read parses the CSV and writes an uncompressed Arrow file keyed by the
+    source fingerprint; later reads memory-map that file and only materialize the
+    requested columns. Without pyarrow this is a plain pd.read_csv.
+    """
+    if feather is None:
+        return pd.read_csv(csv_path, usecols=lambda c: columns is None or c in columns)
+
+    cache_path = _cache_path(csv_path)
+    if not os.path.exists(cache_path):
+        df = pd.read_csv(csv_path)
+        try:
+            write_frame(df, cache_path)
+            _drop_stale(csv_path, keep=cache_path)
+        except OSError:
+            # Read-only data directory: serve this load from the parsed frame.
+            pass
+        if columns is not None:
+            df = df[[c for c in df.columns if c in columns]]
+        return df
+
+    return read_frame(cache_path, columns)
+
+
+def benchmark_load(csv_path, columns=None, repeat=3):
+    """
+    Compare a cold load (CSV parse + cache write) against warm loads from the cache.
+    """
+    cached = _cache_path(csv_path)
+    if os.path.exists(cached):
+        os.remove(cached)
+
+    start = time.perf_counter()
+    read_csv_cached(csv_path, columns)
+    cold = time.perf_counter() - start
+
+    warm = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        read_csv_cached(csv_path, columns)
+        warm.append(time.perf_counter() - start)
+
+    return {"file": os.path.basename(csv_path), "cold_s": cold, "warm_s": min(warm),
+            "speedup": cold / min(warm) if min(warm) > 0 else float("inf")}
+
+
+if __name__ == "__main__":
+    from data_loader import CLEAN_FILE
+    from schema import PIPELINE_COLUMNS
+
+    res = benchmark_load(CLEAN_FILE, PIPELINE_COLUMNS)
+    print(f"{res['file']}: cold {res['cold_s'] * 1000:.1f} ms | "
+          f"warm {res['warm_s'] * 1000:.1f} ms | {res['speedup']:.1f}x")
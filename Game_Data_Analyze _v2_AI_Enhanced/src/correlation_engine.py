@@ -0,0 +1,179 @@
+# @Author : Yulia
+# @File   : correlation_engine.py
+# @Time   : 2025/9/17
+
+import numpy as np
+import pandas as pd
+from scipy.stats import rankdata, t as t_dist
+
+from aggregate_cube import CUBE_DIMS, cell_mask
+
+
+# Every numeric player measure, including the model output.
+CORRELATION_COLUMNS = ["Age", "SessionsPerWeek", "PlayerLevel", "InGamePurchases", "PlayTimeHours",
+                       "AvgSessionDurationMinutes", "AchievementsUnlocked", "Churn_Prob"]
+
+# Fewer complete rows than this and no correlation is reported.
+MIN_ROWS = 5
+
+
+def p_values(r, n):
+    """
+    Two-sided p-values of correlation coefficients (t-test with n - 2 degrees of
+    freedom, the same test pearsonr / spearmanr use), for a whole matrix at once.
+    """
+    r = np.clip(np.asarray(r, dtype=float), -1.0, 1.0)
+    dof = n - 2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t_stat = r * np.sqrt(dof / ((1.0 - r) * (1.0 + r)))
+    return 2 * t_dist.sf(np.abs(t_stat), dof)
+
+
+def correlation_matrices(df, columns=CORRELATION_COLUMNS, pearson=None):
+    """
+    Pearson and Spearman matrices with p-values over all numeric columns, in one pass:
+    every column is ranked once (average ranks for ties), then both matrices are
+    plain correlation matrices of the values and of the ranks.
+    Rows with a missing value in any of the columns are left out.
+
+    `pearson` (from CorrelationStatsStore.query) supplies the Pearson part so only
+    the Spearman ranks are computed from the rows.
+
+    Returns None when fewer than MIN_ROWS complete rows are available.
+    """
+    columns = [c for c in columns if c in df.columns]
+    X = df[columns].dropna().to_numpy(dtype=np.float64)
+    n = len(X)
+    if n < MIN_ROWS or len(columns) < 2:
+        return None
+
+    def frame(values):
+        return pd.DataFrame(values, index=columns, columns=columns)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        spearman = np.corrcoef(rankdata(X, axis=0), rowvar=False)
+        if pearson is None or list(pearson["pearson"].columns) != columns:
+            r = np.corrcoef(X, rowvar=False)
+            pearson = {"pearson": frame(r), "pearson_p": frame(p_values(r, n))}
+
+    return {"n": n, "pearson": pearson["pearson"], "pearson_p": pearson["pearson_p"],
+            "spearman": frame(spearman), "spearman_p": frame(p_values(spearman, n))}
+
+
+def pair_table(matrices, alpha=0.05):
+    """
+    One row per column pair, in the layout of the Correlation Analysis results table.
+    """
+    columns = list(matrices["pearson"].columns)
+    results = []
+    for i in range(len(columns)):
+        for j in range(i + 1, len(columns)):
+            r_p, p_p = matrices["pearson"].iat[i, j], matrices["pearson_p"].iat[i, j]
+            r_s, p_s = matrices["spearman"].iat[i, j], matrices["spearman_p"].iat[i, j]
+            if np.isnan(r_p) and np.isnan(r_s):
+                # Constant column in this segment: nothing to test.
+                continue
+            results.append({
+                "Variable Pairs": f"{columns[i]} vs {columns[j]}",
+                "Pearson r": round(r_p, 3),
+                "Pearson p": round(p_p, 4),
+                "Spearman ρ": round(r_s, 3),
+                "Spearman p": round(p_s, 4),
+                "Significant?": "✅ YES" if (p_p < alpha or p_s < alpha) else "❌ NO"
+            })
+    return pd.DataFrame(results)
+
+
+class CorrelationStatsStore:
+    """
+    Mergeable sufficient statistics for Pearson correlations, per sidebar cell
+    (Location x GameGenre x Gender x InGamePurchases): row count n, column sums and
+    the cross-product matrix (sums of squares on its diagonal). Any filter
+    combination's matrix is derived by adding the matching cells, so the cost does
+    not depend on the number of players; new players are folded in with update().
+
+    Values are shifted by the column means of the first build before the sums are
+    taken, which keeps the cross products well conditioned (Pearson r is shift-invariant).
+    Per-cell minima / maxima tell which columns are constant in a selection: their
+    variance from the sums is cancellation noise, not a usable value.
+    """
+
+    # Bumped when the stored attributes change; older pickles are rebuilt.
+    VERSION = 2
+
+    def __init__(self, df, columns=CORRELATION_COLUMNS):
+        self.columns = [c for c in columns if c in df.columns]
+        self.dims = [c for c in CUBE_DIMS if c in df.columns]
+        self.shift = df[self.columns].mean().to_numpy(dtype=np.float64)
+        k = len(self.columns)
+        self.cells = pd.DataFrame(columns=self.dims)
+        self.n = np.zeros(0, dtype=np.int64)
+        self.sums = np.zeros((0, k))
+        self.cross = np.zeros((0, k, k))
+        self.mins = np.zeros((0, k))
+        self.maxs = np.zeros((0, k))
+        self.update(df)
+
+    def update(self, df):
+        """
+        Fold more (already scored) players into the cell statistics.
+        """
+        complete = df.dropna(subset=self.columns)
+        if len(complete) == 0:
+            return
+        X = complete[self.columns].to_numpy(dtype=np.float64) - self.shift
+
+        # Existing cells keep their position; cells first seen in this batch are appended.
+        keys = complete[self.dims].astype(object)
+        self.cells = pd.concat([self.cells, keys.drop_duplicates()]).drop_duplicates(ignore_index=True)
+        n_cells, added = len(self.cells), len(self.cells) - len(self.n)
+        if added:
+            k = len(self.columns)
+            self.n = np.concatenate([self.n, np.zeros(added, dtype=np.int64)])
+            self.sums = np.concatenate([self.sums, np.zeros((added, k))])
+            self.cross = np.concatenate([self.cross, np.zeros((added, k, k))])
+            self.mins = np.concatenate([self.mins, np.full((added, k), np.inf)])
+            self.maxs = np.concatenate([self.maxs, np.full((added, k), -np.inf)])
+
+        codes = pd.MultiIndex.from_frame(self.cells).get_indexer(pd.MultiIndex.from_frame(keys))
+
+        self.n += np.bincount(codes, minlength=n_cells)
+        for i in range(len(self.columns)):
+            self.sums[:, i] += np.bincount(codes, weights=X[:, i], minlength=n_cells)
+            for j in range(i, len(self.columns)):
+                cross = np.bincount(codes, weights=X[:, i] * X[:, j], minlength=n_cells)
+                self.cross[:, i, j] += cross
+                if i != j:
+                    self.cross[:, j, i] += cross
+
+        grouped = pd.DataFrame(X).groupby(codes)
+        lows, highs = grouped.min(), grouped.max()
+        rows = lows.index.to_numpy()
+        self.mins[rows] = np.minimum(self.mins[rows], lows.to_numpy())
+        self.maxs[rows] = np.maximum(self.maxs[rows], highs.to_numpy())
+
+    def query(self, selected_region, genres, genders, purchase_filter):
+        """
+        Pearson matrix and p-values of a sidebar selection, from the merged cells.
+        Returns None when fewer than MIN_ROWS players match.
+        """
+        mask = cell_mask(self.cells, selected_region, genres, genders, purchase_filter)
+        n = int(self.n[mask].sum())
+        if n < MIN_ROWS:
+            return None
+        mean = self.sums[mask].sum(axis=0) / n
+        cov = self.cross[mask].sum(axis=0) / n - np.outer(mean, mean)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            std = np.sqrt(np.diag(cov))
+            r = np.clip(cov / np.outer(std, std), -1.0, 1.0)
+        r[np.diag_indices_from(r)] = 1.0
+
+        # A constant column has no correlation with anything (NaN, as np.corrcoef gives).
+        constant = self.maxs[mask].max(axis=0) <= self.mins[mask].min(axis=0)
+        r[constant, :] = np.nan
+        r[:, constant] = np.nan
+
+        def frame(values):
+            return pd.DataFrame(values, index=self.columns, columns=self.columns)
+
+        return {"n": n, "pearson": frame(r), "pearson_p": frame(p_values(r, n))}
@@ -5,120 +5,237 @@
 import pandas as pd
 import streamlit as st
 import os
-from sklearn.preprocessing import StandardScaler
-from sklearn.cluster import KMeans
-from sklearn.linear_model import LogisticRegression
 
-import ai_persona
+import model_store
+import player_store
+from aggregate_cube import build_cube, query_cube
+from correlation_engine import CorrelationStatsStore
+from filter_index import FilterIndex
+from instrumentation import traced
+from ingest import stream_clean_csv
+from retention_kernel import RetentionCube
+from risk_index import HIGH_RISK, RiskIndex
+from segment_cache import SegmentCache, segment_key
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data')
+
+# Define the path to the specific file (GAME_DATA_FILE points the app at another
+# cleaned file, e.g. synthetic players from synthetic_data.py for load testing)
+CLEAN_FILE = os.environ.get("GAME_DATA_FILE") or os.path.join(DATA_DIR, "gaming_data_cleaned.csv")
+RAW_FILE = os.path.join(DATA_DIR, "online_gaming_behavior_dataset.csv")
+
+
+def _ensure_clean_file():
+    """
+    Scenario B: If there are no cleaned files, stream the raw Kaggle data through
+    the cleaning rules in bounded chunks (cross-chunk de-duplication) to create them.
+    This ensures your app will never report an error due to missing files.
+    """
+    if not os.path.exists(CLEAN_FILE):
+        try:
+            stream_clean_csv(RAW_FILE, CLEAN_FILE)
+        except FileNotFoundError:
+            st.error(f" Error: Raw data file not found. Please verify that {RAW_FILE} exists.")
+            return False
+    return True
+
+
+@st.cache_data
+@traced()
+def load_catalog():
+    """
+    Sidebar values (Location, GameGenre, Gender) without loading any player rows.
+    Builds the scored store on first use, so it also runs the AI pipeline when needed.
+    """
+    if not _ensure_clean_file():
+        return {}
+
+    meta = player_store.ensure_scored(CLEAN_FILE)
+    if meta is None:
+        # No partitioned store (pyarrow missing or read-only data dir): derive from the rows.
+        return player_store.catalog_values(load_data())
+    return meta["values"]
 
 
 @st.cache_data
-def load_data():
+@traced()
+def load_data(region="Global"):
     """
-    Intelligent data loading: Prioritizes reading the cleaned version; if unavailable, 
+    Intelligent data loading: Prioritizes reading the cleaned version; if unavailable,
     reads the original version and automatically cleans it.
 
     Simultaneously executes AI computation processes.
+    Scored players are stored partitioned by Location, so a regional view only reads
+    its own partition; the Global view is assembled from all partitions.
+    """
+    if not _ensure_clean_file():
+        return pd.DataFrame()
+
+    # ================= AI PIPELINE =================
+    # The AI labels (Persona, Churn Risk) are added by the pipeline in ai_pipeline.py.
+    # Scored players are served from data/.cache/scored while the cleaned file is unchanged,
+    # and fitted models are reused from data/.cache/models while the training data is unchanged.
+    regions = None if region == "Global" else [region]
+    df = player_store.load_scored(CLEAN_FILE, regions)
+    if df is None:
+        df = player_store.build_scored(CLEAN_FILE)
+        if regions is not None:
+            df = df[df["Location"] == region].reset_index(drop=True)
+
+    # Lets filter_data skip the region scan on a frame that only holds that region.
+    df.attrs["region"] = region
+    return df
+
+
+@st.cache_resource(max_entries=8)
+@traced()
+def load_filter_index(region="Global"):
     """
+    Filter index (per-value row-id posting lists) of the frame load_data(region) returns.
+    """
+    return FilterIndex(load_data(region))
+
+
+@st.cache_resource(max_entries=8)
+@traced()
+def load_cube(region="Global"):
+    """
+    Aggregate cube (per filter cell counts / sums) of the frame load_data(region) returns.
+    """
+    return build_cube(load_data(region))
+
+
+@traced()
+def segment_kpis(selected_region, genres, genders, purchase_filter):
+    """
+    Overview KPIs of the sidebar selection, merged from the aggregate cube cells.
+    """
+    return query_cube(load_cube(selected_region), selected_region, genres, genders, purchase_filter)
 
-    current_dir = os.path.dirname(os.path.abspath(__file__))
-    data_dir = os.path.join(current_dir, '..', 'data')
-    
-    # Define the path to the specific file
-    clean_file = os.path.join(data_dir, "gaming_data_cleaned.csv")
-    europe_file = os.path.join(data_dir, "gaming_data_europe.csv")
-
-    raw_file = os.path.join(data_dir, "online_gaming_behavior_dataset.csv")
-
-    # 2. Try loading data
-    if os.path.exists(clean_file):
-        # Scenario A: If data_clean.py has been run, directly read the cleaned data.
-        df = pd.read_csv(clean_file)
-        #Try reading European data; if not, split it from df.
-        if os.path.exists(europe_file):
-            df_europe = pd.read_csv(europe_file)
-        else:
-            df_europe = df[df['Location'] == 'Europe'].copy()
-    else:
-        # Scenario B: If there are no cleaned files, directly read the raw Kaggle data.
-        # This ensures your app will never report an error due to missing files.
-        try:
-            df = pd.read_csv(raw_file)
-            df = df.drop_duplicates()
-            df_europe = df[df['Location'] == 'Europe'].copy()
-        except FileNotFoundError:
-            st.error(f" Error: Raw data file not found. Please verify that {raw_file} exists.")
-            return pd.DataFrame(), pd.DataFrame()
 
-    # ================= AI PIPELINE START =================
-    # This step is to add AI labels (Persona, Churn Risk) to the data.
+@st.cache_resource(max_entries=8)
+@traced()
+def load_retention_cube(region="Global"):
+    """
+    Per filter cell retention histograms of the frame load_data(region) returns.
+    """
+    return RetentionCube(load_data(region))
 
-    # --- A. AI Clustering (K-Means) ---
-    clu_features = ["Age", "SessionsPerWeek", "PlayerLevel", "InGamePurchases"]
-    # Ensure the column exists to prevent errors.
-    valid_clu_features = [c for c in clu_features if c in df.columns]
 
-    if valid_clu_features:
-        X_clu = df[valid_clu_features].fillna(0)
-        scaler = StandardScaler()
-        X_scaled = scaler.fit_transform(X_clu)
+@traced()
+def segment_retention(selected_region, genres, genders, purchase_filter):
+    """
+    Joint retention histogram of the sidebar selection, merged from the cube cells.
+    """
+    return load_retention_cube(selected_region).query(selected_region, genres, genders, purchase_filter)
+
+
+@st.cache_resource(max_entries=8)
+@traced()
+def load_risk_index(region="Global"):
+    """
+    Per filter cell row ids ranked by churn risk, for the frame load_data(region) returns.
+    """
+    return RiskIndex(load_data(region))
+
+
+@traced()
+def segment_top_risk(segment, selected_region, genres, genders, purchase_filter, k=10, offset=0, level=HIGH_RISK):
+    """
+    The players ranked offset .. offset + k by churn risk in the sidebar selection
+    (only `level` and above), and how many players of that level the selection has.
+
+    `segment` is the selection's frame (load_segment). Its index labels are the row
+    positions in load_data(selected_region), so the ranked rows are gathered from it
+    and the (copied on every call) region frame is not loaded.
+    """
+    index = load_risk_index(selected_region)
+    rows = index.top_k(selected_region, genres, genders, purchase_filter, k, offset, level)
+    return segment.loc[rows], index.count(selected_region, genres, genders, purchase_filter, level)
 
-        kmeans = KMeans(n_clusters=5, random_state=42, n_init=10)
-        df["Cluster"] = kmeans.fit_predict(X_scaled)
 
-        # Tagging using the LLM module
-        df = ai_persona.apply_persona_tags(df)
-    else:
-        # If the columns are incorrect, provide a default value to prevent subsequent code crashes.
-        df["Persona"] = "Standard Player"
+@st.cache_resource
+@traced()
+def load_corr_stats():
+    """
+    Per-cell correlation sufficient statistics of all players, read from the scored
+    store (kept current by append_players) or rebuilt from the rows.
+    """
+    if not _ensure_clean_file():
+        return CorrelationStatsStore(pd.DataFrame())
+    store = player_store.load_corr_stats(CLEAN_FILE)
+    if store is None:
+        store = CorrelationStatsStore(load_data())
+        player_store.save_corr_stats(store, CLEAN_FILE)
+    return store
 
-    # --- B. Predictive Analytics (Churn Risk) ---
-    # Define churn as fewer than 2 sessions per week.
-    if "SessionsPerWeek" in df.columns:
-        df["Is_Churn"] = df["SessionsPerWeek"].apply(lambda x: 1 if x < 2 else 0)
 
-        # Training Logistic Regression
-        pred_features = ["Age", "PlayerLevel", "InGamePurchases"]
-        valid_pred_features = [c for c in pred_features if c in df.columns]
+@traced()
+def segment_pearson(selected_region, genres, genders, purchase_filter):
+    """
+    Pearson matrix and p-values of the sidebar selection, merged from the stored cells.
+    """
+    return load_corr_stats().query(selected_region, genres, genders, purchase_filter)
 
-        if valid_pred_features:
-            X_pred = df[valid_pred_features].fillna(0)
-            y_pred = df["Is_Churn"]
 
-            model = LogisticRegression(max_iter=1000)
-            try:
-                model.fit(X_pred, y_pred)
-                df["Churn_Prob"] = model.predict_proba(X_pred)[:, 1]
-            except:
-                df["Churn_Prob"] = 0.0
-        else:
-            df["Churn_Prob"] = 0.0
-    else:
-        df["Churn_Prob"] = 0.0
+def load_model_evaluation():
+    """
+    Cross-validated metrics of the churn model that scored the stored players
+    (ai_pipeline.evaluate_churn_model); None when unavailable.
+    """
+    if not _ensure_clean_file():
+        return None
+    meta = player_store.ensure_scored(CLEAN_FILE)
+    return _model_evaluation(meta["model_key"]) if meta else None
 
-    # Risk level classification
-    def risk_level(prob):
-        if prob > 0.7:
-            return "High Risk 🔴"
-        elif prob > 0.4:
-            return "Medium Risk 🟡"
-        else:
-            return "Safe 🟢"
 
-    df["Risk_Level"] = df["Churn_Prob"].apply(risk_level)
+@st.cache_data
+@traced()
+def _model_evaluation(model_key):
+    # One entry per model fingerprint: a refit gets its own evaluation. It is computed
+    # on the players the model was trained on, not on the ones appended since.
+    models = model_store.load_models(model_key)
+    if models is None:
+        return None
+    return player_store.model_evaluation(CLEAN_FILE, models)
+
+
+@st.cache_resource
+def get_segment_cache():
+    """
+    LRU cache of filtered segments shared by all modules and sessions.
+    """
+    return SegmentCache()
 
-    # ================= AI PIPELINE END =================
 
-    return df, df_europe
+@traced()
+def load_segment(selected_region, genres, genders, purchase_filter):
+    """
+    Filtered players for the sidebar selection, served from the segment cache so a
+    rerun with the same (order-insensitive) filters does not filter again.
+    """
+    return get_segment_cache().get_or_compute(
+        segment_key(selected_region, genres, genders, purchase_filter),
+        lambda: filter_data(load_data(selected_region), selected_region, genres, genders, purchase_filter,
+                            index=load_filter_index(selected_region)))
 
 
-def filter_data(df, selected_region, genres, genders, purchase_filter):
+@traced()
+def filter_data(df, selected_region, genres, genders, purchase_filter, index=None):
     """
     Sidebar Filtering Logic
+
+    With a FilterIndex built on `df`, the selection is answered from its posting
+    lists and only the matching rows are gathered (no copy of the full frame).
     """
+    if index is not None:
+        rows = index.query(selected_region, genres, genders, purchase_filter,
+                           skip_region=df.attrs.get("region") == selected_region)
+        return df if rows is None else df.iloc[rows]
+
     data = df.copy()
 
-    if selected_region != "Global":
+    if selected_region != "Global" and data.attrs.get("region") != selected_region:
         data = data[data["Location"] == selected_region]
 
     if genres:
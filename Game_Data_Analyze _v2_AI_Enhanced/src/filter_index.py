@@ -0,0 +1,109 @@
+# @Author : Yulia
+# @File   : filter_index.py
+# @Time   : 2025/9/13
+
+import numpy as np
+import pandas as pd
+
+
+# Columns behind the sidebar filters.
+FILTER_COLUMNS = ["Location", "GameGenre", "Gender", "InGamePurchases"]
+
+PURCHASE_VALUES = {"Paid players": 1, "Not-paid players": 0}
+
+
+class FilterIndex:
+    """
+    Posting lists for the sidebar filters: for every value of every filter column,
+    the sorted row positions holding it. Built once per loaded frame; a filter is
+    answered by merging / intersecting these arrays instead of scanning columns.
+    """
+
+    def __init__(self, df):
+        self.n_rows = len(df)
+        self.postings = {}
+        for col in FILTER_COLUMNS:
+            if col in df.columns:
+                self.postings[col] = self._build(df[col])
+
+    @staticmethod
+    def _build(series):
+        codes, uniques = pd.factorize(series, sort=False)
+        # One stable sort groups the row ids by value, each group still in row order.
+        order = np.argsort(codes, kind="stable").astype(np.int32)
+        counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+        starts = np.concatenate([[0], np.cumsum(counts)]) + int((codes < 0).sum())
+        return {value: order[starts[i]:starts[i + 1]] for i, value in enumerate(uniques.tolist())}
+
+    def _rows_for(self, col, values):
+        lists = [self.postings[col].get(v, np.empty(0, dtype=np.int32)) for v in values]
+        if len(lists) == 1:
+            return lists[0]
+        # Posting lists of different values are disjoint, so a sort merges them.
+        return np.sort(np.concatenate(lists), kind="stable")
+
+    def _intersect(self, a, b):
+        mark = np.zeros(self.n_rows, dtype=bool)
+        mark[a] = True
+        return b[mark[b]]
+
+    def query(self, selected_region, genres, genders, purchase_filter, skip_region=False):
+        """
+        Sorted row positions matching the sidebar selection, or None when nothing is
+        filtered (every row matches).
+        """
+        selections = []
+        if selected_region != "Global" and not skip_region and "Location" in self.postings:
+            selections.append(("Location", [selected_region]))
+        if genres and "GameGenre" in self.postings:
+            selections.append(("GameGenre", list(genres)))
+        if genders and "Gender" in self.postings:
+            selections.append(("Gender", list(genders)))
+        if purchase_filter in PURCHASE_VALUES and "InGamePurchases" in self.postings:
+            selections.append(("InGamePurchases", [PURCHASE_VALUES[purchase_filter]]))
+
+        if not selections:
+            return None
+
+        row_sets = sorted((self._rows_for(col, values) for col, values in selections), key=len)
+        rows = row_sets[0]
+        for other in row_sets[1:]:
+            if len(rows) == 0:
+                break
+            rows = self._intersect(rows, other)
+        return rows
+
+
+def benchmark_filters(df, sizes=(40_000, 1_000_000, 10_000_000), repeat=5):
+    """
+    Filter latency of the column-scan filter_data against the index, per frame size.
+    """
+    import time
+    from data_loader import filter_data
+
+    args = ("Europe", ["Action", "RPG"], ["Male"], "Paid players")
+    results = []
+    for size in sizes:
+        data = df.iloc[np.arange(size) % len(df)].reset_index(drop=True)
+
+        start = time.perf_counter()
+        index = FilterIndex(data)
+        build = time.perf_counter() - start
+
+        timings = {}
+        for name, kwargs in [("scan", {}), ("index", {"index": index})]:
+            best = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                filter_data(data, *args, **kwargs)
+                best = min(best, time.perf_counter() - start)
+            timings[name] = best
+        results.append({"rows": size, "index_build_s": build, "scan_s": timings["scan"],
+                        "index_s": timings["index"], "speedup": timings["scan"] / timings["index"]})
+    return pd.DataFrame(results)
+
+
+if __name__ == "__main__":
+    from data_loader import load_data
+
+    print(benchmark_filters(load_data()).to_string(index=False))
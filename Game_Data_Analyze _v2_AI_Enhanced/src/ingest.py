@@ -0,0 +1,83 @@
+# @Author : Yulia
+# @File   : ingest.py
+# @Time   : 2025/9/9
+
+import os
+
+import numpy as np
+import pandas as pd
+
+
+DEFAULT_CHUNK_ROWS = 100_000
+
+
+class RowHashSet:
+    """
+    Compact set of 64-bit row hashes kept as one sorted NumPy array (8 bytes per
+    unique row), used to drop duplicates across chunks without holding the rows.
+    """
+
+    def __init__(self):
+        self._hashes = np.empty(0, dtype=np.uint64)
+
+    def __len__(self):
+        return len(self._hashes)
+
+    def add_new(self, hashes):
+        """
+        Return a mask of the hashes not seen before (first occurrence only) and add them.
+        """
+        hashes = np.asarray(hashes, dtype=np.uint64)
+        unique, first = np.unique(hashes, return_index=True)
+
+        pos = np.searchsorted(self._hashes, unique)
+        seen = np.zeros(len(unique), dtype=bool)
+        inside = pos < len(self._hashes)
+        seen[inside] = self._hashes[pos[inside]] == unique[inside]
+
+        # The new hashes are sorted, so inserting them at their search positions keeps
+        # the array sorted: one copy per chunk instead of re-sorting every stored hash.
+        self._hashes = np.insert(self._hashes, pos[~seen], unique[~seen])
+        keep = np.zeros(len(hashes), dtype=bool)
+        keep[first[~seen]] = True
+        return keep
+
+
+def stream_clean_csv(raw_file, clean_file, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Stream the raw Kaggle export into the cleaned CSV with a fixed memory ceiling.
+
+    The raw file is read in chunks of `chunk_rows`; duplicate rows are removed across
+    the whole file through a RowHashSet (de-duplication is the only cleaning step of
+    notebooks/data_clean.ipynb), and surviving rows are appended to the output.
+    Output is written to a temporary file and moved into place at the end, so a failed
+    run never leaves a partial file.
+
+    Returns a dict with the number of rows read and written.
+    """
+    seen = RowHashSet()
+    rows_in, rows_out = 0, 0
+    tmp_file = clean_file + ".tmp"
+
+    try:
+        for i, chunk in enumerate(pd.read_csv(raw_file, chunksize=chunk_rows)):
+            rows_in += len(chunk)
+            keep = seen.add_new(pd.util.hash_pandas_object(chunk, index=False).to_numpy())
+            chunk = chunk[keep]
+            rows_out += len(chunk)
+            chunk.to_csv(tmp_file, mode="a" if i else "w", header=not i, index=False)
+
+        os.replace(tmp_file, clean_file)
+    finally:
+        if os.path.exists(tmp_file):
+            os.remove(tmp_file)
+
+    return {"rows_in": rows_in, "rows_out": rows_out, "duplicates": rows_in - rows_out}
+
+
+if __name__ == "__main__":
+    import sys
+    from data_loader import CLEAN_FILE, RAW_FILE
+
+    stats = stream_clean_csv(sys.argv[1] if len(sys.argv) > 1 else RAW_FILE, CLEAN_FILE)
+    print(f"Read {stats['rows_in']} rows, wrote {stats['rows_out']} ({stats['duplicates']} duplicates removed)")
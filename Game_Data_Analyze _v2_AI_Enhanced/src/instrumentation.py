@@ -0,0 +1,278 @@
+# @Author : Yulia
+# @File   : instrumentation.py
+# @Time   : 2025/9/26
+
+import contextvars
+import functools
+import itertools
+import json
+import os
+import threading
+import time
+import tracemalloc
+from collections import deque
+
+import pandas as pd
+
+
+# Tracing is off unless PERF_TRACE is set or the sidebar Performance panel turns it on.
+# PERF_TRACE_MEMORY adds the tracemalloc peak per span (slow); PERF_LOG is a JSON-lines
+# file every finished span is appended to. The environment gives the defaults; configure()
+# sets the switches of the current context only (one dashboard session, tagged with its
+# `scope`), and propagate() hands them to worker threads.
+_DEFAULTS = {
+    "enabled": bool(os.environ.get("PERF_TRACE")),
+    "memory": bool(os.environ.get("PERF_TRACE_MEMORY")),
+    "log_file": os.environ.get("PERF_LOG") or None,
+    "scope": None,
+}
+_config = contextvars.ContextVar("perf_config", default=_DEFAULTS)
+DEFAULT_LOG_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', '.cache', 'perf',
+                                'spans.jsonl')
+
+# Most recent spans kept in memory for the panel.
+MAX_RECORDS = 2000
+
+_records = deque(maxlen=MAX_RECORDS)
+_sequence = itertools.count(1)
+_last_seq = 0
+_lock = threading.Lock()
+_local = threading.local()
+
+# tracemalloc is process-wide: it runs while any scope traces memory. Its peak is too,
+# so the open memory-traced spans are tracked to detect overlaps between threads.
+# A scope's memory tracing lapses MEMORY_LEASE_S after its last configure() (every
+# dashboard rerun renews it), so a session that disconnects with it on does not keep
+# tracemalloc running for everyone; the default scope (None) does not lapse.
+MEMORY_LEASE_S = 600
+_memory_scopes = {}  # scope -> lease expiry (time.monotonic), None for no expiry
+_open_memory_spans = set()
+
+
+def _sync_tracemalloc():
+    now = time.monotonic()
+    for scope in [s for s, expiry in _memory_scopes.items() if expiry is not None and expiry < now]:
+        del _memory_scopes[scope]
+    if _memory_scopes and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    elif not _memory_scopes and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+if _DEFAULTS["enabled"] and _DEFAULTS["memory"]:
+    _memory_scopes[None] = None
+    _sync_tracemalloc()
+
+
+def configure(enabled=None, memory=None, log_file=False, scope=False):
+    """
+    Change the tracing switches of the current context (thread); arguments left out
+    keep their value (log_file=None stops logging). `scope` tags the spans recorded
+    here, e.g. with a session id (see records()). Memory tracing starts tracemalloc,
+    which then slows the whole process until no scope traces memory any more (a scope
+    that is not configured again within MEMORY_LEASE_S stops counting).
+    """
+    config = dict(_config.get())
+    if enabled is not None:
+        config["enabled"] = bool(enabled)
+    if memory is not None:
+        config["memory"] = bool(memory)
+    if log_file is not False:
+        config["log_file"] = log_file
+    if scope is not False:
+        config["scope"] = scope
+    _config.set(config)
+    with _lock:
+        if config["enabled"] and config["memory"]:
+            _memory_scopes[config["scope"]] = None if config["scope"] is None else time.monotonic() + MEMORY_LEASE_S
+        else:
+            _memory_scopes.pop(config["scope"], None)
+        _sync_tracemalloc()
+    return settings()
+
+
+def settings():
+    """
+    Switches of the current context: {"enabled", "memory", "log_file", "scope"}.
+    """
+    return dict(_config.get())
+
+
+def propagate(fn):
+    """
+    `fn` wrapped to run with the tracing switches of the current context; threads
+    start with the defaults, so wrap what is handed to a worker thread (one wrapper
+    per call: a context cannot be entered by two threads at once).
+    """
+    return functools.partial(contextvars.copy_context().run, fn)
+
+
+def _rows(value):
+    if isinstance(value, (pd.DataFrame, pd.Series)):
+        return len(value)
+    return None
+
+
+class Span:
+    """
+    One timed stage. Set `rows_in` / `rows_out` on it inside the `with` block when
+    the caller knows them.
+    """
+
+    def __init__(self, name, rows_in=None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.config = _config.get()
+
+    def __enter__(self):
+        stack = _local.__dict__.setdefault("stack", [])
+        self.parent = stack[-1].name if stack else None
+        self.thread_id = threading.get_ident()
+        self.child_peak = 0
+        self.overlapped = False
+        self.memory = self.config["memory"] and tracemalloc.is_tracing()
+        if self.memory:
+            with _lock:
+                # Peaks are measured from a reset; the peak of the enclosing span is
+                # kept through child_peak since the reset discards it. The reset (and
+                # the peak) covers every thread, so spans open on two threads at once
+                # get no peak.
+                others = [s for s in _open_memory_spans if s.thread_id != self.thread_id]
+                for s in others:
+                    s.overlapped = True
+                self.overlapped = bool(others)
+                _open_memory_spans.add(self)
+                self.start_memory, peak = tracemalloc.get_traced_memory()
+                if stack:
+                    stack[-1].child_peak = max(stack[-1].child_peak, peak)
+                tracemalloc.reset_peak()
+        stack.append(self)
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        wall_s = time.perf_counter() - self.start
+        stack = _local.stack
+        stack.pop()
+        peak_mb = None
+        if self.memory:
+            with _lock:
+                _open_memory_spans.discard(self)
+                if not self.overlapped and tracemalloc.is_tracing():
+                    peak = max(tracemalloc.get_traced_memory()[1], self.child_peak)
+                    peak_mb = max(peak - self.start_memory, 0) / 2 ** 20
+                    if stack:
+                        stack[-1].child_peak = max(stack[-1].child_peak, peak)
+        _record({"ts": time.time(), "name": self.name, "parent": self.parent, "wall_s": wall_s,
+                 "rows_in": self.rows_in, "rows_out": self.rows_out, "peak_mb": peak_mb,
+                 "thread": threading.current_thread().name, "thread_id": self.thread_id,
+                 "scope": self.config["scope"], "error": exc[0].__name__ if exc[0] else None},
+                self.config["log_file"])
+        return False
+
+
+class _NullSpan:
+    rows_in = rows_out = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name, rows_in=None):
+    """
+    Context manager timing the block as stage `name` (a shared no-op when tracing
+    is off).
+    """
+    return Span(name, rows_in) if _config.get()["enabled"] else _NULL_SPAN
+
+
+def traced(name=None):
+    """
+    Decorator: run the function inside a span named `name` (default: the function
+    name). Rows in / out are taken from the first argument and the result (or its
+    first item) when they are DataFrames.
+    """
+    def decorator(fn):
+        stage = name or fn.__name__
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _config.get()["enabled"]:
+                return fn(*args, **kwargs)
+            with Span(stage, _rows(args[0]) if args else None) as s:
+                result = fn(*args, **kwargs)
+                s.rows_out = _rows(result[0] if isinstance(result, tuple) and result else result)
+            return result
+        return wrapper
+    return decorator
+
+
+def _record(entry, log_file):
+    global _last_seq
+    with _lock:
+        _last_seq = entry["seq"] = next(_sequence)
+        _records.append(entry)
+        if log_file:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(log_file)), exist_ok=True)
+                with open(log_file, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            except OSError:
+                pass
+
+
+def mark():
+    """
+    Sequence number of the last recorded span; pass it to records() to get only
+    the spans recorded after this point (e.g. during one script run).
+    """
+    return _last_seq
+
+
+def records(since=0, scope=None, thread_id=None):
+    """
+    Recorded spans after sequence number `since`, oldest first, as a DataFrame;
+    only those of `scope` and / or of the thread `thread_id` when given.
+    """
+    with _lock:
+        rows = [r for r in _records if r["seq"] > since and (scope is None or r["scope"] == scope)
+                and (thread_id is None or r["thread_id"] == thread_id)]
+    columns = ["seq", "ts", "name", "parent", "wall_s", "rows_in", "rows_out", "peak_mb", "thread", "thread_id",
+               "scope", "error"]
+    return pd.DataFrame(rows, columns=columns)
+
+
+def read_log(path=None):
+    """
+    Spans of a JSON-lines log as a DataFrame (for offline analysis).
+    """
+    return pd.read_json(path or _config.get()["log_file"] or DEFAULT_LOG_FILE, lines=True)
+
+
+def summary(frame):
+    """
+    Calls, total / mean / max wall time, rows and peak memory per stage, slowest first.
+    """
+    if frame.empty:
+        return frame
+    grouped = frame.groupby("name", sort=False)
+    table = grouped.agg(calls=("wall_s", "size"), total_s=("wall_s", "sum"), mean_s=("wall_s", "mean"),
+                        max_s=("wall_s", "max"), rows_in=("rows_in", "max"), rows_out=("rows_out", "max"),
+                        peak_mb=("peak_mb", "max"))
+    return table.sort_values("total_s", ascending=False).reset_index()
+
+
+if __name__ == "__main__":
+    import sys
+
+    print(summary(read_log(sys.argv[1] if len(sys.argv) > 1 else None)).to_string(index=False))
@@ -0,0 +1,77 @@
+# @Author : Yulia
+# @File   : model_store.py
+# @Time   : 2025/9/10
+
+import hashlib
+import json
+import os
+import time
+
+import joblib
+import pandas as pd
+import sklearn
+
+
+MODEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', '.cache', 'models')
+
+
+def training_fingerprint(df, features, config):
+    """
+    Hash of the training rows (feature columns only), the feature list and the
+    pipeline config. The scikit-learn version is part of the key because pickled
+    estimators are not portable across versions.
+    """
+    features = [c for c in features if c in df.columns]
+    h = hashlib.sha1()
+    h.update(pd.util.hash_pandas_object(df[features], index=False).to_numpy().tobytes())
+    h.update(json.dumps({"features": features, "config": config,
+                         "sklearn": sklearn.__version__}, sort_keys=True).encode("utf-8"))
+    return h.hexdigest()[:20]
+
+
+def _artifact_path(key, model_dir):
+    # MODEL_DIR is looked up per call, so it can be pointed elsewhere (benchmark.scratch_store).
+    return os.path.join(model_dir or MODEL_DIR, f"ai_pipeline-{key}.joblib")
+
+
+def load_models(key, model_dir=None):
+    """
+    Load the fitted models stored under `key`; None if missing or unreadable.
+    """
+    path = _artifact_path(key, model_dir)
+    if not os.path.exists(path):
+        return None
+    try:
+        return joblib.load(path)
+    except Exception:
+        # Corrupt or incompatible artifact: treat as a cache miss and retrain.
+        return None
+
+
+def save_models(key, models, model_dir=None):
+    """
+    Persist the fitted models under `key`. Failures (read-only disk) are ignored.
+    """
+    path = _artifact_path(key, model_dir)
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        joblib.dump(models, tmp_path)
+        os.replace(tmp_path, path)
+    except OSError:
+        pass
+
+
+def get_or_train(df, train_fn, features, config, model_dir=None):
+    """
+    Return the models for this training data, fitting them with `train_fn(df, config)`
+    only when no artifact exists for the data/feature/config fingerprint.
+    """
+    key = training_fingerprint(df, features, config)
+    models = load_models(key, model_dir)
+    if models is None:
+        models = train_fn(df, config)
+        models["key"] = key
+        models["trained_at"] = time.time()
+        save_models(key, models, model_dir)
+    return models
@@ -5,11 +5,16 @@
 import streamlit as st
 import plotly.express as px
 
+from aggregate_cube import kpis_from_rows
+from binning import category_counts, integer_counts, histogram_bins, grouped_counts
+from instrumentation import traced
 
-def render_smart_insights(df):
+
+def render_smart_insights(df, kpis=None):
     """
     Rule-based NLG (Natural Language Generation) insights dashboard,
     automatically generating conclusions based on the currently filtered data.
+    `kpis` (from the aggregate cube) avoids scanning the rows.
     """
     if df.empty:
         return
@@ -17,17 +22,14 @@ def render_smart_insights(df):
     st.markdown("### 💡 AI Smart Insights")
 
     # 1. Prepare data indicators
-    avg_session = df["SessionsPerWeek"].mean()
-    pay_rate = df["InGamePurchases"].mean()
-    total_users = len(df)
-
-    # Check if there is any risk data predicted by AI.
-    if "Risk_Level" in df.columns:
-        high_risk_count = len(df[df["Risk_Level"] == "High Risk 🔴"])
-        risk_ratio = high_risk_count / total_users if total_users > 0 else 0
-    else:
-        high_risk_count = 0
-        risk_ratio = 0
+    if kpis is None:
+        kpis = kpis_from_rows(df)
+    avg_session = kpis["avg_sessions"]
+    pay_rate = kpis["pay_rate"]
+
+    # Risk data predicted by AI (0 when the column is missing).
+    high_risk_count = kpis["high_risk_count"]
+    risk_ratio = kpis["risk_ratio"]
 
     insights = []
 
@@ -66,29 +68,40 @@ def render_smart_insights(df):
     st.divider()
 
 
-def render_overview(filtered_data, selected_region, render=True):
+@traced()
+def render_overview(filtered_data, selected_region, render=True, kpis=None):
     """
     Render overview page
+    KPI cards and insights come from `kpis` (aggregate cube) when given.
     """
+    if kpis is None:
+        kpis = kpis_from_rows(filtered_data)
+
     if render:
         # 1. First, demonstrate intelligent insights.
-        render_smart_insights(filtered_data)
+        render_smart_insights(filtered_data, kpis)
         st.subheader("🧭 Data Overview")
 
     # Calculate basic indicators
     metrics = {
-        "Total number of players": len(filtered_data),
-        "Average age": round(filtered_data["Age"].mean(), 1),
-        "Proportion of paying players": f"{filtered_data['InGamePurchases'].mean() * 100:.1f}%",
-        "Average number of sessions": round(filtered_data["SessionsPerWeek"].mean(), 1),
-        "Proportion of highly engaged players": f"{(filtered_data['EngagementLevel'] == 'High').mean() * 100:.1f}%" if 'EngagementLevel' in filtered_data.columns else "N/A"
+        "Total number of players": kpis["total_users"],
+        "Average age": round(kpis["avg_age"], 1),
+        "Proportion of paying players": f"{kpis['pay_rate'] * 100:.1f}%",
+        "Average number of sessions": round(kpis["avg_sessions"], 1),
+        "Proportion of highly engaged players": f"{kpis['high_engagement_rate'] * 100:.1f}%" if kpis["high_engagement_rate"] is not None else "N/A"
     }
 
     # Generate figures
-    fig_location = px.histogram(filtered_data, x="Location", title=f"Geography ({selected_region})", text_auto=True)
-    fig_age = px.histogram(filtered_data, x="Age", nbins=20, title="Age Distribution")
-    fig_gender = px.pie(filtered_data, names="Gender", title="Gender Distribution")
-    fig_sessions = px.histogram(filtered_data, x="SessionsPerWeek", title="Weekly Sessions Distribution")
+    # Charts are built from pre-binned counts, so the figure payload does not grow with the player count.
+    fig_location = px.bar(category_counts(filtered_data["Location"]), x="Location", y="count",
+                          title=f"Geography ({selected_region})", text_auto=True)
+    age_bins = histogram_bins(filtered_data["Age"], nbins=20)
+    fig_age = px.bar(age_bins, x="Age", y="count", title="Age Distribution")
+    fig_age.update_traces(width=age_bins["width"])
+    gender_counts = category_counts(filtered_data["Gender"])
+    fig_gender = px.pie(gender_counts, names="Gender", values="count", title="Gender Distribution")
+    fig_sessions = px.bar(integer_counts(filtered_data["SessionsPerWeek"]), x="SessionsPerWeek", y="count",
+                          title="Weekly Sessions Distribution")
 
     # Compatibility check: Some columns may not exist.
     figs = {
@@ -99,21 +112,24 @@ def render_overview(filtered_data, selected_region, render=True):
     }
 
     if "EngagementLevel" in filtered_data.columns:
-        fig_engagement = px.pie(filtered_data, names="EngagementLevel", title="Engagement Level")
+        fig_engagement = px.pie(category_counts(filtered_data["EngagementLevel"]), names="EngagementLevel",
+                                values="count", title="Engagement Level")
         figs["Engagement Level"] = fig_engagement
     else:
         fig_engagement = None
 
     if "PlayerLevel" in filtered_data.columns:
-        fig_purchase = px.histogram(filtered_data, x="PlayerLevel", color="InGamePurchases",
-                                    barmode="group", title="Paying Players by Level")
+        fig_purchase = px.bar(grouped_counts(filtered_data, "PlayerLevel", "InGamePurchases"),
+                              x="PlayerLevel", y="count", color="InGamePurchases",
+                              barmode="group", title="Paying Players by Level")
         figs["Level vs Payment"] = fig_purchase
     else:
         fig_purchase = None
 
     if "GameGenre" in filtered_data.columns:
-        fig_genre_purchase = px.histogram(filtered_data, x="GameGenre", color="InGamePurchases",
-                                          barmode="group", title="Paying Players by Game Type")
+        fig_genre_purchase = px.bar(grouped_counts(filtered_data, "GameGenre", "InGamePurchases"),
+                                    x="GameGenre", y="count", color="InGamePurchases",
+                                    barmode="group", title="Paying Players by Game Type")
         figs["Genre vs Payment"] = fig_genre_purchase
     else:
         fig_genre_purchase = None
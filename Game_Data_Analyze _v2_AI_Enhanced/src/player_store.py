@@ -0,0 +1,428 @@
+# @Author : Yulia
+# @File   : player_store.py
+# @Time   : 2025/9/11
+
+import json
+import os
+import re
+import threading
+import uuid
+
+import joblib
+import numpy as np
+import pandas as pd
+
+import model_store
+from ai_pipeline import PIPELINE_CONFIG, PIPELINE_FEATURES, cluster_stats, ensure_evaluation, get_models, score_players
+from correlation_engine import CorrelationStatsStore
+from columnar_cache import feather, file_fingerprint, read_csv_cached, read_frame, write_frame
+from schema import PIPELINE_COLUMNS, apply_schema
+from time_index import JOIN_DAY, assign_join_days
+
+
+STORE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'data', '.cache', 'scored')
+META_FILE = os.path.join(STORE_DIR, "players_scored.json")
+CORR_STATS_FILE = os.path.join(STORE_DIR, "correlation_stats.joblib")
+
+# Scored players are stored as one Arrow file per region, so a regional view only
+# reads its own partition. Rows within a partition are kept in JoinDay order (time index).
+# Appended batches are written as extra fragment files of their regions; once a region
+# has more than MAX_FRAGMENTS of them they are compacted into its partition file.
+PARTITION_COLUMN = "Location"
+MAX_FRAGMENTS = 16
+ALL_PARTITION = "All"
+CATALOG_COLUMNS = ["Location", "GameGenre", "Gender"]
+
+# A background refit is started once the appended players move the model this far.
+DRIFT_THRESHOLDS = {
+    "centroid_shift": 0.25,  # max centroid movement, in standard deviations (scaled space)
+    "churn_rate_delta": 0.05,  # absolute change of the churn base rate
+}
+
+_lock = threading.Lock()
+_refit_lock = threading.Lock()
+_refit_thread = None
+
+
+def _read_meta():
+    if not os.path.exists(META_FILE):
+        return None
+    with open(META_FILE, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _write_meta(meta):
+    tmp_path = META_FILE + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, META_FILE)
+
+
+def _write_corr_stats(store, source_file):
+    tmp_path = CORR_STATS_FILE + ".tmp"
+    joblib.dump({"source_fingerprint": file_fingerprint(source_file), "version": store.VERSION, "store": store},
+                tmp_path)
+    os.replace(tmp_path, CORR_STATS_FILE)
+
+
+def _running_stats(df, models):
+    """
+    Drift statistics of an already scored frame, in the same form as models["stats"].
+    """
+    stats = {"n": len(df), "churn_rate": None, "cluster_counts": None, "cluster_sums": None}
+    if "Is_Churn" in df.columns and len(df):
+        stats["churn_rate"] = float(df["Is_Churn"].mean())
+    if models["kmeans"] is not None and len(df):
+        X_scaled = models["scaler"].transform(df[models["clu_features"]].fillna(0))
+        stats.update(cluster_stats(X_scaled, df["Cluster"].to_numpy(), len(models["kmeans"].cluster_centers_)))
+    return stats
+
+
+def _merge_stats(a, b):
+    merged = {"n": a["n"] + b["n"], "churn_rate": None, "cluster_counts": None, "cluster_sums": None}
+    if a["churn_rate"] is not None and b["churn_rate"] is not None:
+        merged["churn_rate"] = (a["churn_rate"] * a["n"] + b["churn_rate"] * b["n"]) / merged["n"]
+    if a["cluster_counts"] is not None and b["cluster_counts"] is not None:
+        merged["cluster_counts"] = (np.add(a["cluster_counts"], b["cluster_counts"])).tolist()
+        merged["cluster_sums"] = (np.add(a["cluster_sums"], b["cluster_sums"])).tolist()
+    return merged
+
+
+def measure_drift(stats, models):
+    """
+    Compare the running statistics of all scored players with the fitted model:
+    how far the per-cluster means moved away from the K-Means centroids, and how
+    far the churn base rate moved from the rate seen in training.
+    """
+    drift = {"centroid_shift": 0.0, "churn_rate_delta": 0.0}
+    if models["kmeans"] is not None and stats["cluster_counts"] is not None:
+        counts = np.asarray(stats["cluster_counts"], dtype=float)
+        sums = np.asarray(stats["cluster_sums"])
+        present = counts > 0
+        means = sums[present] / counts[present, None]
+        shift = np.linalg.norm(means - models["kmeans"].cluster_centers_[present], axis=1)
+        drift["centroid_shift"] = float(shift.max()) if len(shift) else 0.0
+    trained_rate = models.get("stats", {}).get("churn_rate")
+    if trained_rate is not None and stats["churn_rate"] is not None:
+        drift["churn_rate_delta"] = abs(stats["churn_rate"] - trained_rate)
+    return drift
+
+
+def _partition_file(region):
+    # Every write gets a new file name: the files of the current meta are never
+    # rewritten, only unlinked once a new meta no longer refers to them.
+    safe = re.sub(r"[^\w-]", "_", str(region))
+    return f"{PARTITION_COLUMN}={safe}.{uuid.uuid4().hex[:12]}.arrow"
+
+
+def _region_groups(df):
+    if PARTITION_COLUMN not in df.columns:
+        return [(ALL_PARTITION, df)]
+    return df.groupby(PARTITION_COLUMN, observed=True, sort=False)
+
+
+def _write_sorted(part, name):
+    if JOIN_DAY in part.columns:
+        part = part.sort_values(JOIN_DAY, kind="stable")
+    write_frame(part.reset_index(drop=True), os.path.join(STORE_DIR, name))
+
+
+def _write_partitions(df, partitions):
+    """
+    Write one Arrow file per region of `df` and return the updated region -> file map.
+    """
+    for region, part in _region_groups(df):
+        name = _partition_file(region)
+        _write_sorted(part, name)
+        partitions[str(region)] = name
+    return partitions
+
+
+def _store_files(meta):
+    """
+    Every file of the store: partition files and appended fragments.
+    """
+    fragments = meta.get("fragments", {})
+    return list(meta["partitions"].values()) + [f for names in fragments.values() for f in names]
+
+
+def _remove_files(names):
+    for name in names:
+        try:
+            os.remove(os.path.join(STORE_DIR, name))
+        except FileNotFoundError:
+            pass
+
+
+def _append_fragments(batch, partitions, fragments):
+    """
+    Write the rows of `batch` as one new fragment per region (a new region gets its
+    partition file instead). Returns the updated partition and fragment maps and the
+    files they no longer refer to, to be removed once the new meta is written.
+    A region with more than MAX_FRAGMENTS fragments is compacted: its partition and
+    fragments are merged into one new JoinDay-sorted partition file. Only that
+    compaction reads stored rows, so an append costs O(batch) amortized.
+    """
+    partitions, fragments = dict(partitions), {r: list(f) for r, f in fragments.items()}
+    superseded = []
+    for region, part in _region_groups(batch):
+        region = str(region)
+        if region not in partitions:
+            partitions[region] = _partition_file(region)
+            _write_sorted(part, partitions[region])
+            continue
+
+        names = fragments.setdefault(region, [])
+        names.append(_partition_file(region))
+        _write_sorted(part, names[-1])
+
+        if len(names) > MAX_FRAGMENTS:
+            files = [partitions[region]] + names
+            merged = pd.concat([read_frame(os.path.join(STORE_DIR, f)) for f in files], ignore_index=True)
+            partitions[region] = _partition_file(region)
+            _write_sorted(apply_schema(merged), partitions[region])
+            superseded += files
+            del fragments[region]
+    return partitions, fragments, superseded
+
+
+def catalog_values(df, previous=None):
+    """
+    Distinct sidebar values (in order of first appearance), so the app can build
+    its filters without loading any rows.
+    """
+    values = previous or {}
+    for col in CATALOG_COLUMNS:
+        if col in df.columns:
+            seen = values.get(col, [])
+            values[col] = seen + [v for v in pd.unique(df[col].astype(str)) if v not in seen]
+    return values
+
+
+def read_meta(source_file):
+    """
+    Store metadata (partitions, sidebar values, model key) if the store is current
+    for `source_file`, otherwise None.
+    """
+    if feather is None:
+        return None
+    meta = _read_meta()
+    if meta is None or meta["source_fingerprint"] != file_fingerprint(source_file):
+        return None
+    # A store written with a different column set or pipeline config is rebuilt as well.
+    if meta.get("columns") != PIPELINE_COLUMNS or meta.get("config") != PIPELINE_CONFIG:
+        return None
+    if not all(os.path.exists(os.path.join(STORE_DIR, f)) for f in _store_files(meta)):
+        return None
+    return meta
+
+
+def load_scored(source_file, regions=None):
+    """
+    Scored players of the given regions (all when None), reading only their
+    partitions. None when the store is missing, was built from a different version
+    of the file, or pyarrow is unavailable.
+    """
+    meta = read_meta(source_file)
+    if meta is None:
+        return None
+    partitions = meta["partitions"]
+    wanted = list(partitions) if regions is None else [r for r in regions if r in partitions]
+    if not wanted:
+        # Unknown region: an empty frame with the stored columns.
+        return apply_schema(read_frame(os.path.join(STORE_DIR, next(iter(partitions.values())))).iloc[:0])
+    fragments = meta.get("fragments", {})
+    try:
+        frames = [read_frame(os.path.join(STORE_DIR, f))
+                  for r in wanted for f in [partitions[r]] + fragments.get(r, [])]
+    except FileNotFoundError:
+        # A writer replaced the meta and removed the files it no longer uses since
+        # it was read here: read the new version.
+        return load_scored(source_file, regions)
+    df = frames[0] if len(frames) == 1 else pd.concat(frames, ignore_index=True)
+    return apply_schema(df)
+
+
+def load_corr_stats(source_file):
+    """
+    The stored per-cell correlation statistics, or None if missing or stale.
+    """
+    meta = read_meta(source_file)
+    if meta is None or not os.path.exists(CORR_STATS_FILE):
+        return None
+    try:
+        saved = joblib.load(CORR_STATS_FILE)
+    except Exception:
+        return None
+    if saved.get("version") != CorrelationStatsStore.VERSION:
+        return None
+    return saved["store"] if saved.get("source_fingerprint") == meta["source_fingerprint"] else None
+
+
+def save_corr_stats(store, source_file):
+    """
+    Store correlation statistics built outside save_scored (e.g. for a store written
+    before they existed). Ignored when the scored store is not current.
+    """
+    if read_meta(source_file) is None:
+        return
+    try:
+        with _lock:
+            _write_corr_stats(store, source_file)
+    except OSError:
+        pass
+
+
+def save_scored(df, source_file, models, stats=None):
+    """
+    Persist the scored dataset, partitioned by Location, together with the source
+    fingerprint, the key of the models that scored it, its running drift statistics
+    and the per-cell correlation statistics.
+    """
+    if feather is None:
+        return
+    try:
+        with _lock:
+            old = _read_meta()
+            partitions = _write_partitions(df, {})
+            _write_corr_stats(CorrelationStatsStore(df), source_file)
+            _write_meta({"source_fingerprint": file_fingerprint(source_file),
+                         "model_key": models.get("key"),
+                         "stats": stats if stats is not None else _running_stats(df, models),
+                         "partitions": partitions,
+                         "fragments": {},
+                         "values": catalog_values(df),
+                         "columns": PIPELINE_COLUMNS,
+                         "config": PIPELINE_CONFIG})
+            # Only once the new meta is in place: readers of the old one may still use them.
+            if old:
+                _remove_files(set(_store_files(old)) - set(partitions.values()))
+    except OSError:
+        pass
+
+
+def build_scored(source_file):
+    """
+    Run the AI pipeline over the cleaned CSV and store the scored result.
+    """
+    df = apply_schema(assign_join_days(read_csv_cached(source_file, PIPELINE_COLUMNS)))
+    models = get_models(df)
+    df = apply_schema(score_players(df, models))
+    save_scored(df, source_file, models)
+    return df
+
+
+def ensure_scored(source_file):
+    """
+    Make sure the partitioned store is current for `source_file` (rebuilding it,
+    reusing stored models where possible) and return its metadata.
+    Nothing is read from the partitions when the store is already current.
+    """
+    meta = read_meta(source_file)
+    if meta is None:
+        build_scored(source_file)
+        meta = read_meta(source_file)
+    return meta
+
+
+def load_training_frame(source_file, models):
+    """
+    The players `models` were trained on. Appended players only go to the end of
+    `source_file`, so these are its first models["stats"]["n"] rows; None when that
+    prefix no longer matches the models' training fingerprint (file rewritten).
+    """
+    n = models.get("stats", {}).get("n")
+    if n is None or "key" not in models:
+        return None
+    df = apply_schema(assign_join_days(read_csv_cached(source_file, PIPELINE_COLUMNS).iloc[:n].copy()))
+    if len(df) != n or model_store.training_fingerprint(df, PIPELINE_FEATURES, PIPELINE_CONFIG) != models["key"]:
+        return None
+    return df
+
+
+def model_evaluation(source_file, models):
+    """
+    Cross-validated churn metrics of `models` (ai_pipeline.ensure_evaluation), always
+    on their training frame: get_models evaluates it right after training, and older
+    artifacts without an evaluation are evaluated on the recovered training rows, not
+    on the players appended since. None when the training rows cannot be recovered.
+    """
+    if "evaluation" in models:
+        return models["evaluation"]
+    df = load_training_frame(source_file, models)
+    return ensure_evaluation(df, models) if df is not None else None
+
+
+def _refit(source_file):
+    global _refit_thread
+    try:
+        build_scored(source_file)
+    finally:
+        with _refit_lock:
+            _refit_thread = None
+
+
+def append_players(new_rows, source_file, thresholds=DRIFT_THRESHOLDS, background=True):
+    """
+    Score a batch of newly arrived players with the stored models and add them to
+    the cached scored dataset, in time proportional to the batch size: the batch is
+    written as new fragment files of its regions and no stored rows are read (apart
+    from the occasional compaction of a region, see _append_fragments).
+
+    Clusters are assigned to the nearest existing centroid and churn is scored with
+    the existing model. The raw rows are appended to `source_file` so the CSV stays
+    the source of truth. If the accumulated drift exceeds `thresholds`, a full refit
+    is started in a background thread.
+
+    Returns a dict with the rows added, the measured drift and whether a refit started.
+    """
+    global _refit_thread
+
+    meta = read_meta(source_file)
+    models = model_store.load_models(meta["model_key"]) if meta else None
+    if meta is None or models is None:
+        raise RuntimeError("No up-to-date scored dataset to append to; run load_data() first.")
+
+    header = pd.read_csv(source_file, nrows=0).columns.tolist()
+    raw = new_rows[[c for c in header if c in new_rows.columns]].reindex(columns=header)
+
+    batch = apply_schema(assign_join_days(raw[[c for c in PIPELINE_COLUMNS if c in raw.columns]].copy()))
+    batch = score_players(batch, models)
+    batch = apply_schema(batch)
+
+    with _lock:
+        # Re-read under the lock: a concurrent append may have written since.
+        corr_stats = load_corr_stats(source_file)
+        meta = _read_meta()
+        raw.to_csv(source_file, mode="a", header=False, index=False)
+        partitions, fragments, superseded = _append_fragments(batch, meta["partitions"], meta.get("fragments", {}))
+        stats = _merge_stats(meta["stats"], _running_stats(batch, models))
+        if corr_stats is not None:
+            corr_stats.update(batch)
+            _write_corr_stats(corr_stats, source_file)
+        _write_meta({**meta, "source_fingerprint": file_fingerprint(source_file), "stats": stats,
+                     "partitions": partitions, "fragments": fragments,
+                     "values": catalog_values(batch, meta["values"])})
+        _remove_files(superseded)
+
+    drift = measure_drift(stats, models)
+    refit = any(drift[k] > thresholds[k] for k in thresholds)
+    thread = None
+    with _refit_lock:
+        if refit and _refit_thread is None:
+            thread = _refit_thread = threading.Thread(target=_refit, args=(source_file,), daemon=True)
+            thread.start()
+    if thread is not None and not background:
+        thread.join()
+
+    return {"rows_added": len(batch), "drift": drift, "refit_started": refit}
+
+
+if __name__ == "__main__":
+    import sys
+    from data_loader import CLEAN_FILE
+
+    ensure_scored(CLEAN_FILE)
+    result = append_players(pd.read_csv(sys.argv[1]), CLEAN_FILE, background=False)
+    print(f"Appended {result['rows_added']} players | drift {result['drift']} | "
+          f"refit {'done' if result['refit_started'] else 'not needed'}")
@@ -5,18 +5,42 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
+import plotly.graph_objects as go
 
+from ai_pipeline import RISK_LEVELS
+from instrumentation import traced
+from risk_index import HIGH_RISK, top_k_rows
 
-def render_prediction(filtered_data, render=True):
+# Sizes offered for one page of the high-risk cohort table.
+PAGE_SIZES = [10, 50, 100, 500]
+
+
+@traced()
+def render_prediction(filtered_data, render=True, top_risk=None, evaluation=None):
+    """
+    `top_risk(k, offset, level)` returns the players at `level` or above ranked
+    offset .. offset + k by churn risk and how many such players there are
+    (data_loader.segment_top_risk, answered from the risk index); without it they are
+    ranked by partial selection over `filtered_data`.
+
+    `evaluation` is the cross-validated model quality (data_loader.load_model_evaluation);
+    its accuracy is returned for the report, None without it.
+    """
     # Check if it contains forecast data
     if "Churn_Prob" not in filtered_data.columns:
         if render:
             st.warning("Prediction data missing.")
         return None, None
 
+    if top_risk is None:
+        def top_risk(k, offset=0, level=HIGH_RISK):
+            rows = top_k_rows(filtered_data, k, offset, level)
+            at_level = filtered_data["Risk_Level"].isin(RISK_LEVELS[RISK_LEVELS.index(level):])
+            return filtered_data.iloc[rows], int(at_level.sum())
+
     # 1. Risk Overview KPIs
-    high_risk_users = filtered_data[filtered_data["Risk_Level"] == "High Risk 🔴"]
-    risk_rate = len(high_risk_users) / len(filtered_data) * 100 if len(filtered_data) > 0 else 0
+    _, high_risk_count = top_risk(0)
+    risk_rate = high_risk_count / len(filtered_data) * 100 if len(filtered_data) > 0 else 0
 
     # 2. Churn probability distribution chart (Histogram)
     fig_hist = px.histogram(
@@ -41,25 +65,86 @@ def render_prediction(filtered_data, render=True):
         """)
 
         col1, col2, col3 = st.columns(3)
-        col1.metric("High Risk Users", f"{len(high_risk_users)}")
+        col1.metric("High Risk Users", f"{high_risk_count}")
         col2.metric("Predicted Churn Rate", f"{risk_rate:.1f}%")
         col3.metric("Model Type", "Logistic Regression")
 
         st.plotly_chart(fig_hist, use_container_width=True)
 
+        _render_evaluation(evaluation)
+
         # 3. High-risk user list (Actionable Insights)
         st.subheader("🚨 High Risk Cohort (Action Required)")
-        st.caption("Top 10 players most likely to churn. Recommended Action: Send 'Come Back' gift.")
+        st.caption("Players most likely to churn, highest risk first. Recommended Action: Send 'Come Back' gift.")
 
         display_cols = ["PlayerID", "Age", "SessionsPerWeek", "Persona", "Churn_Prob"]
         # Ensure the column exists
         cols_to_show = [c for c in display_cols if c in filtered_data.columns]
 
-        st.dataframe(
-            high_risk_users[cols_to_show].sort_values(by="Churn_Prob", ascending=False).head(10),
-            use_container_width=True
-        )
+        level = st.selectbox("Minimum risk level", RISK_LEVELS[::-1], key="risk_level")
+        _, cohort_count = top_risk(0, 0, level)
+        if cohort_count == 0:
+            st.info(f"No players at '{level}' or above in the current selection.")
+        else:
+            col4, col5, col6 = st.columns(3)
+            k = min(int(col4.number_input("Cohort size (top K)", min_value=1, value=10, step=10, key="risk_k")),
+                    cohort_count)
+            page_size = col5.selectbox("Rows per page", PAGE_SIZES, key="risk_page_size")
+            pages = -(-k // page_size)
+            page = min(int(col6.number_input(f"Page (of {pages})", min_value=1, value=1, step=1, key="risk_page")),
+                       pages)
+
+            offset = (page - 1) * page_size
+            cohort_page, _ = top_risk(min(page_size, k - offset), offset, level)
+            st.dataframe(cohort_page[cols_to_show], use_container_width=True)
+
+            # The full cohort is only ranked and written when the button is clicked.
+            st.download_button(
+                label=f"⬇️ Download top {k:,} players (CSV)",
+                data=lambda: top_risk(k, 0, level)[0][cols_to_show].to_csv(index=False),
+                file_name=f"churn_risk_top_{k}.csv",
+                mime="text/csv"
+            )
+
+    # Returns the cross-validated accuracy and a graph, maintaining consistency with the main app's interface.
+    model_acc = evaluation["accuracy"] if evaluation else None
+    return model_acc, fig_hist
+
+
+def _render_evaluation(evaluation):
+    """
+    Out-of-sample quality of the churn model: headline metrics, precision / recall at
+    the risk thresholds and the calibration curve.
+    """
+    st.subheader("📏 Model Evaluation")
+    if not evaluation:
+        st.info("Model evaluation unavailable (the churn model could not be cross-validated).")
+        return
+    st.caption(f"{evaluation['folds']}-fold stratified cross-validation over the {evaluation['n']:,} training "
+               f"players (churn rate {evaluation['churn_rate'] * 100:.1f}%), computed once per trained model. "
+               f"The metrics describe the model, not the current filter.")
+
+    roc_auc = evaluation["roc_auc"]
+    col1, col2, col3 = st.columns(3)
+    col1.metric("CV Accuracy", f"{evaluation['accuracy'] * 100:.1f}%")
+    col2.metric("ROC-AUC", f"{roc_auc:.3f}" if roc_auc is not None else "n/a")
+    col3.metric("Brier Score", f"{evaluation['brier']:.4f}")
 
-    # Returns a simulation accuracy (0.85) and a graph, maintaining consistency with the main app's interface.
+    col4, col5 = st.columns(2)
+    thresholds = pd.DataFrame(evaluation["thresholds"]).rename(columns={
+        "threshold": "Flag if Churn_Prob >", "flagged": "Players Flagged",
+        "precision": "Precision", "recall": "Recall"})
+    col4.markdown("**Precision / recall at the risk thresholds**")
+    col4.dataframe(thresholds, hide_index=True, use_container_width=True)
 
-    return 0.85, fig_hist
+    calibration = pd.DataFrame(evaluation["calibration"])
+    fig_cal = go.Figure([
+        go.Scatter(x=[0, 1], y=[0, 1], mode="lines", name="Perfect calibration", line={"dash": "dash", "color": "gray"}),
+        go.Scatter(x=calibration["mean_predicted"], y=calibration["observed_rate"], mode="lines+markers",
+                   name="Model", customdata=calibration[["bin", "players"]],
+                   hovertemplate="Bin %{customdata[0]}<br>Players %{customdata[1]}<br>"
+                                 "Predicted %{x:.3f}<br>Observed %{y:.3f}<extra></extra>"),
+    ])
+    fig_cal.update_layout(title="Calibration", xaxis_title="Mean predicted churn probability",
+                          yaxis_title="Observed churn rate", height=350)
+    col5.plotly_chart(fig_cal, use_container_width=True)
@@ -8,7 +8,19 @@ from reportlab.lib.styles import getSampleStyleSheet
 from reportlab.lib.pagesizes import A4
 from reportlab.lib.units import cm
 
-def export_full_report(metrics, results_df, figs, model_acc, selected_charts):
+from chart_images import render_images
+from instrumentation import span, traced
+
+@traced()
+def export_full_report(metrics, results_df, figs, model_acc, selected_charts, timings=None, subtitle=None,
+                       render_workers=None, evaluation=None):
+    """
+    Build the PDF report. The selected charts are rasterized in parallel on
+    `render_workers` processes (and served from the image cache when unchanged);
+    pass a dict as `timings` to receive the per-figure render times. `subtitle`
+    (e.g. the segment) is printed under the title. `evaluation` (the churn model's
+    cross-validation metrics) is printed under the accuracy.
+    """
     buffer = BytesIO()
     doc = SimpleDocTemplate(buffer, pagesize=A4)
     story = []
@@ -16,6 +28,8 @@ def export_full_report(metrics, results_df, figs, model_acc, selected_charts):
 
     # --- Title ---
     story.append(Paragraph("🎮 Player Behavior Analysis Report", styles["Title"]))
+    if subtitle:
+        story.append(Paragraph(subtitle, styles["Heading3"]))
     story.append(Spacer(1, 12))
 
     # --- Overview ---
@@ -35,19 +49,33 @@ def export_full_report(metrics, results_df, figs, model_acc, selected_charts):
     if model_acc is not None:
         story.append(Paragraph("🤖 Prediction Model", styles["Heading2"]))
         story.append(Paragraph(f"Accuracy: {model_acc*100:.2f}%", styles["Normal"]))
+        if evaluation:
+            story.append(Paragraph(f"{evaluation['folds']}-fold stratified cross-validation over "
+                                   f"{evaluation['n']:,} training players "
+                                   f"(churn rate {evaluation['churn_rate']*100:.1f}%)",
+                                   styles["Normal"]))
+            if evaluation["roc_auc"] is not None:
+                story.append(Paragraph(f"ROC-AUC: {evaluation['roc_auc']:.3f}", styles["Normal"]))
+            story.append(Paragraph(f"Brier score: {evaluation['brier']:.4f}", styles["Normal"]))
+            for row in evaluation["thresholds"]:
+                story.append(Paragraph(f"Churn_Prob &gt; {row['threshold']}: {row['flagged']:,} flagged, "
+                                       f"precision {row['precision']*100:.1f}%, recall {row['recall']*100:.1f}%",
+                                       styles["Normal"]))
         story.append(Spacer(1, 12))
 
     # --- Figures ---
-    for title, fig in figs.items():
-        if title not in selected_charts:
-            continue
-        img_buf = BytesIO()
-        fig.write_image(img_buf, format="png")
-        img_buf.seek(0)
+    with span("export_full_report.render_images"):
+        images, render_timings = render_images({title: fig for title, fig in figs.items() if title in selected_charts},
+                                               workers=render_workers)
+    if timings is not None:
+        timings.update(render_timings)
+    for title, image in images.items():
+        img_buf = BytesIO(image)
         story.append(Paragraph(title, styles["Heading2"]))
         story.append(Image(img_buf, width=12*cm, height=7*cm))
         story.append(Spacer(1, 12))
 
-    doc.build(story)
+    with span("export_full_report.build_pdf"):
+        doc.build(story)
     buffer.seek(0)
     return buffer
@@ -0,0 +1,159 @@
+# @Author : Yulia
+# @File   : report_job.py
+# @Time   : 2025/9/21
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from instrumentation import propagate
+from overview import render_overview
+from retention import render_retention_funnel
+from simulation_trend import render_trend
+from correlation import render_correlation
+from clustering import render_clustering
+from prediction import render_prediction
+from report_export import export_full_report
+
+
+# Threads running the modules of one report (REPORT_JOB_WORKERS overrides it).
+REPORT_WORKERS = int(os.environ.get("REPORT_JOB_WORKERS", 0)) or min(6, os.cpu_count() or 1)
+
+
+# Each module runs headlessly (render=False) on a segment dict: "data" (filtered
+# players), "region", and optionally the precomputed "kpis", "hist", "pearson" and
+# "evaluation" of data_loader. Chart titles match the ones used by app.py.
+def _overview(segment):
+    metrics, figs = render_overview(segment["data"], segment["region"], render=False, kpis=segment.get("kpis"))
+    return {"metrics": metrics, "figs": figs}
+
+
+def _retention(segment):
+    fig_ret, fig_fun = render_retention_funnel(segment["data"], render=False, hist=segment.get("hist"))
+    return {"figs": {"Retention Rate": fig_ret, "Funnel Analysis": fig_fun}}
+
+
+def _trend(segment):
+    fig_new, fig_pay, fig_sess = render_trend(segment["data"], render=False)
+    return {"figs": {"New Players Trend": fig_new, "Paying Players Trend": fig_pay, "Session Trend": fig_sess}}
+
+
+def _correlation(segment):
+    results_df, fig_corr, fig_scat, fig_box = render_correlation(segment["data"], render=False,
+                                                                 pearson=segment.get("pearson"))
+    return {"results_df": results_df, "figs": {"Correlation Heatmap": fig_corr, "Correlation Scatter": fig_scat,
+                                               "Correlation Boxplot": fig_box}}
+
+
+def _clustering(segment):
+    fig_cluster, _ = render_clustering(segment["data"], render=False)
+    return {"figs": {"AI Cluster 3D Plot": fig_cluster}}
+
+
+def _prediction(segment):
+    acc, fig_churn_dist = render_prediction(segment["data"], render=False, evaluation=segment.get("evaluation"))
+    return {"model_acc": acc, "evaluation": segment.get("evaluation"),
+            "figs": {"Churn Risk Distribution": fig_churn_dist}}
+
+
+REPORT_MODULES = {
+    "Overview": _overview,
+    "Retention & Funnel": _retention,
+    "Simulated Trend": _trend,
+    "Correlation Analysis": _correlation,
+    "Cluster Analysis": _clustering,
+    "Predictive Modeling": _prediction,
+}
+
+
+def collect_report(segment, modules=None, workers=None, progress=None):
+    """
+    Run the report modules on `segment` in worker threads and merge their output
+    into the arguments of export_full_report. Figures keep the module order.
+    `progress(module_name)` is called as each module finishes.
+    """
+    modules = list(modules or REPORT_MODULES)
+    workers = workers or REPORT_WORKERS
+    outputs, timings = {}, {}
+
+    def run(name):
+        start = time.perf_counter()
+        result = REPORT_MODULES[name](segment)
+        timings[name] = time.perf_counter() - start
+        return result
+
+    with ThreadPoolExecutor(min(workers, len(modules))) as pool:
+        futures = {pool.submit(propagate(run), name): name for name in modules}
+        for future in as_completed(futures):
+            outputs[futures[future]] = future.result()
+            if progress is not None:
+                progress(futures[future])
+
+    report = {"metrics": None, "results_df": None, "model_acc": None, "evaluation": None, "figs": {},
+              "timings": timings}
+    for name in modules:
+        for key, value in outputs[name].items():
+            if key == "figs":
+                report["figs"].update({title: fig for title, fig in value.items() if fig is not None})
+            else:
+                report[key] = value
+    return report
+
+
+class ReportJob:
+    """
+    A full report built in a background thread, so the dashboard stays usable.
+    Poll `progress` / `stage`; when `done`, the PDF bytes are in `pdf` (or the
+    exception in `error`).
+    """
+
+    def __init__(self, segment, modules=None):
+        self.segment = segment
+        self.modules = list(modules or REPORT_MODULES)
+        self.steps = len(self.modules) + 1  # modules, then the PDF
+        self.completed = 0
+        self.stage = "Queued"
+        self.pdf = None
+        self.error = None
+        self.render_timings = {}
+        self.module_timings = {}
+        self.started_at = None
+        self.elapsed = None
+        # Spans of the job are recorded with the tracing switches of the session that created it.
+        self._thread = threading.Thread(target=propagate(self._run), daemon=True)
+
+    def start(self):
+        self.started_at = time.perf_counter()
+        self._thread.start()
+        return self
+
+    @property
+    def done(self):
+        return self.pdf is not None or self.error is not None
+
+    @property
+    def progress(self):
+        return self.completed / self.steps
+
+    def _advance(self, name):
+        self.completed += 1
+        self.stage = f"{name} ready"
+
+    def _run(self):
+        try:
+            self.stage = "Running modules"
+            report = collect_report(self.segment, self.modules, progress=self._advance)
+            self.module_timings = report["timings"]
+            self.stage = "Rendering charts and building the PDF"
+            buffer = export_full_report(report["metrics"], report["results_df"], report["figs"], report["model_acc"],
+                                        list(report["figs"]), timings=self.render_timings,
+                                        evaluation=report["evaluation"])
+            self.completed = self.steps
+            self.stage = "Done"
+            self.pdf = buffer.getvalue()
+        except Exception as e:
+            self.stage = "Failed"
+            self.error = e
+        finally:
+            self.elapsed = time.perf_counter() - self.started_at
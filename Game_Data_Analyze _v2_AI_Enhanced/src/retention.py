@@ -7,26 +7,39 @@ import pandas as pd
 import plotly.express as px
 import plotly.graph_objects as go
 
-def render_retention_funnel(filtered_data, render=True):
-    total_players = len(filtered_data)
-    day1_retained = (filtered_data['SessionsPerWeek'] >= 1).sum() / total_players if total_players else 0
-    day7_retained = (filtered_data['SessionsPerWeek'] >= 2).sum() / total_players if total_players else 0
-    day30_retained = (filtered_data['SessionsPerWeek'] >= 4).sum() / total_players if total_players else 0
+from instrumentation import traced
+from retention_kernel import FUNNEL_STAGES, RETENTION_THRESHOLDS, RetentionHistogram
+
+
+@traced()
+def render_retention_funnel(filtered_data, render=True, thresholds=RETENTION_THRESHOLDS, stages=FUNNEL_STAGES,
+                            hist=None):
+    """
+    `thresholds` (name -> minimum sessions per week) and `stages` (extra funnel
+    stages, see retention_kernel.FUNNEL_STAGES) are all answered from one joint
+    histogram of the segment: `hist` (from data_loader.segment_retention) or one
+    counted from `filtered_data`.
+    """
+    if render:
+        st.subheader("📈 Retention & Funnel")
+        with st.expander("⚙️ Retention thresholds (sessions per week)"):
+            cols = st.columns(len(thresholds))
+            thresholds = {name: cols[i].number_input(name, min_value=0, value=int(t), step=1, key=f"ret_{name}")
+                          for i, (name, t) in enumerate(thresholds.items())}
+
+    if hist is None:
+        hist = RetentionHistogram.from_frame(filtered_data)
+    rates = hist.retention(thresholds)
 
     retention = pd.DataFrame({
-        "Day": ["Day1", "Day7", "Day30"],
-        "RetentionRate": [day1_retained, day7_retained, day30_retained]
+        "Day": list(rates.keys()),
+        "RetentionRate": list(rates.values())
     })
     fig_retention = px.bar(retention, x="Day", y="RetentionRate",
                            text=[f"{x:.1%}" for x in retention["RetentionRate"]],
                            title="Player Retention Rate")
 
-    funnel_stages = {
-        "All Players": total_players,
-        "Active (≥2/wk)": (filtered_data['SessionsPerWeek'] >= 2).sum(),
-        "Highly Engaged": (filtered_data['EngagementLevel'] == "High").sum(),
-        "Paying Players": filtered_data['InGamePurchases'].sum()
-    }
+    funnel_stages = hist.funnel(stages)
     fig_funnel = go.Figure(go.Funnel(
         y=list(funnel_stages.keys()),
         x=list(funnel_stages.values()),
@@ -34,7 +47,6 @@ def render_retention_funnel(filtered_data, render=True):
     ))
 
     if render:
-        st.subheader("📈 Retention & Funnel")
         st.plotly_chart(fig_retention, use_container_width=True)
         st.plotly_chart(fig_funnel, use_container_width=True)
 
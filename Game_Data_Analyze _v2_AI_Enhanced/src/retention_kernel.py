@@ -0,0 +1,122 @@
+# @Author : Yulia
+# @File   : retention_kernel.py
+# @Time   : 2025/9/18
+
+import numpy as np
+import pandas as pd
+
+from aggregate_cube import CUBE_DIMS, cell_codes, cell_mask
+
+
+ENGAGEMENT_LEVELS = ["Low", "Medium", "High"]
+
+# Retention proxy: share of players with at least this many sessions per week.
+RETENTION_THRESHOLDS = {"Day1": 1, "Day7": 2, "Day30": 4}
+
+# Funnel stages after "All Players". Each stage counts the players matching all of
+# its conditions: min_sessions (SessionsPerWeek >=), engagement (EngagementLevel in)
+# and paying (InGamePurchases > 0 or == 0).
+FUNNEL_STAGES = [
+    ("Active (≥2/wk)", {"min_sessions": 2}),
+    ("Highly Engaged", {"engagement": ["High"]}),
+    ("Paying Players", {"paying": True}),
+]
+
+
+def _engagement_codes(series):
+    """
+    Position of each label in ENGAGEMENT_LEVELS; unknown labels get the slot after them.
+    Categorical columns are mapped through their (few) categories, not per row.
+    """
+    cat = series if isinstance(series.dtype, pd.CategoricalDtype) else series.astype("category")
+    lookup = [ENGAGEMENT_LEVELS.index(c) if c in ENGAGEMENT_LEVELS else len(ENGAGEMENT_LEVELS)
+              for c in cat.cat.categories]
+    # Code -1 (missing) picks the trailing "unknown" entry.
+    lookup = np.array(lookup + [len(ENGAGEMENT_LEVELS)], dtype=np.int32)
+    return lookup[cat.cat.codes.to_numpy()]
+
+
+def joint_histogram(df, row_cells=None, n_cells=1):
+    """
+    Player counts by SessionsPerWeek x EngagementLevel x paying (shape
+    n_sessions x levels x 2), in one np.bincount pass over the rows. With
+    `row_cells` (cell number per row) one histogram per cell is counted in the
+    same pass, shape n_cells x n_sessions x levels x 2.
+    """
+    sessions = df["SessionsPerWeek"].fillna(0).to_numpy().astype(np.int32).clip(min=0)
+    engagement = _engagement_codes(df["EngagementLevel"])
+    paying = df["InGamePurchases"].fillna(0).to_numpy() > 0
+
+    n_sessions = int(sessions.max()) + 1 if len(df) else 1
+    n_levels = len(ENGAGEMENT_LEVELS) + 1
+    codes = (sessions * n_levels + engagement) * 2 + paying
+    size = n_sessions * n_levels * 2
+    if row_cells is None:
+        return np.bincount(codes, minlength=size).reshape(n_sessions, n_levels, 2)
+    codes = row_cells.astype(np.int64) * size + codes
+    return np.bincount(codes, minlength=n_cells * size).reshape(n_cells, n_sessions, n_levels, 2)
+
+
+class RetentionHistogram:
+    """
+    Joint histogram of SessionsPerWeek x EngagementLevel x paying for one segment.
+    Retention rates and funnel stage counts are read from a reverse cumulative sum
+    over the sessions axis, so any thresholds or extra stages cost no row scans.
+    """
+
+    def __init__(self, hist):
+        self.total = int(hist.sum())
+        # at_least[s] = counts of players with SessionsPerWeek >= s.
+        self.at_least = np.cumsum(hist[::-1], axis=0)[::-1]
+
+    @classmethod
+    def from_frame(cls, df):
+        return cls(joint_histogram(df))
+
+    def count(self, min_sessions=0, engagement=None, paying=None):
+        """
+        Number of players matching all of the given conditions.
+        """
+        if min_sessions >= len(self.at_least):
+            return 0
+        block = self.at_least[max(int(min_sessions), 0)]
+        if engagement is not None:
+            block = block[[ENGAGEMENT_LEVELS.index(level) for level in engagement if level in ENGAGEMENT_LEVELS]]
+        else:
+            block = block.reshape(-1, 2)
+        if paying is not None:
+            block = block[:, 1 if paying else 0]
+        return int(block.sum())
+
+    def retention(self, thresholds=RETENTION_THRESHOLDS):
+        """
+        Retention rate per named threshold.
+        """
+        return {name: self.count(min_sessions=t) / self.total if self.total else 0
+                for name, t in thresholds.items()}
+
+    def funnel(self, stages=FUNNEL_STAGES):
+        """
+        Player count per funnel stage, starting with "All Players".
+        """
+        counts = {"All Players": self.total}
+        for name, conditions in stages:
+            counts[name] = self.count(**conditions)
+        return counts
+
+
+class RetentionCube:
+    """
+    Joint retention histograms per sidebar cell (Location x GameGenre x Gender x
+    InGamePurchases), counted in one pass per loaded frame. A segment's histogram is
+    the sum of its matching cells, so changing filters or thresholds never scans rows.
+    """
+
+    def __init__(self, df):
+        dims = [c for c in CUBE_DIMS if c in df.columns]
+        row_cells, self.cells = cell_codes(df[dims])
+        self.hist = joint_histogram(df, row_cells, len(self.cells))
+
+    def query(self, selected_region, genres, genders, purchase_filter):
+        mask = cell_mask(self.cells, selected_region, genres, genders, purchase_filter)
+        return RetentionHistogram(self.hist[mask].sum(axis=0))
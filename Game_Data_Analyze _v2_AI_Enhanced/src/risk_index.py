@@ -0,0 +1,128 @@
+# @Author : Yulia
+# @File   : risk_index.py
+# @Time   : 2025/9/23
+
+import numpy as np
+import pandas as pd
+
+from aggregate_cube import CUBE_DIMS, cell_codes, cell_mask
+from ai_pipeline import RISK_LEVELS, risk_levels
+
+
+HIGH_RISK = RISK_LEVELS[-1]
+
+
+def _risk_scores(df):
+    """
+    Ranking key: risk level code plus Churn_Prob (in [0, 1]), so a higher level always
+    ranks first even where the float32 probabilities tie across a threshold.
+    """
+    probs = df["Churn_Prob"].to_numpy(dtype=np.float64)
+    levels = df["Risk_Level"] if "Risk_Level" in df.columns else pd.Series(risk_levels(probs))
+    codes = pd.Categorical(levels, categories=RISK_LEVELS).codes.astype(np.int64)
+    return codes, codes * 2.0 + probs
+
+
+def _ranked(candidates, scores, offset, k):
+    """
+    Ranks offset .. offset + k of `candidates` by score (highest first, ties in row
+    order, as a stable sort). Only the candidates scoring at least the (offset + k)-th
+    highest score are sorted; all rows tied with it are kept, so every page agrees
+    with one full stable sort.
+    """
+    need = offset + k
+    if need < len(candidates):
+        kth = np.partition(-scores[candidates], need - 1)[need - 1]
+        candidates = candidates[-scores[candidates] <= kth]
+    candidates = candidates[np.lexsort((candidates, -scores[candidates]))]
+    return candidates[offset:offset + k]
+
+
+def top_k_rows(df, k=10, offset=0, level=None):
+    """
+    Positions of the players ranked offset .. offset + k by churn risk (highest first),
+    optionally only those at `level` or above. Partial selection (np.partition)
+    when no RiskIndex is available, so only the selected rows are sorted.
+    """
+    if "Churn_Prob" not in df.columns:
+        return np.empty(0, dtype=np.int64)
+    codes, scores = _risk_scores(df)
+    candidates = np.arange(len(df)) if level is None else np.flatnonzero(codes >= RISK_LEVELS.index(level))
+    return _ranked(candidates, scores, offset, k)
+
+
+class RiskIndex:
+    """
+    Row positions pre-sorted by churn risk within every sidebar cell (Location x
+    GameGenre x Gender x InGamePurchases). Built once per loaded frame; a top-K query
+    for any filter takes at most offset + k rows from each matching cell and merges
+    them, so pulling a cohort costs nothing proportional to the segment size.
+    """
+
+    def __init__(self, df):
+        dims = [c for c in CUBE_DIMS if c in df.columns]
+        row_cells, self.cells = cell_codes(df[dims])
+        self.levels, self.scores = _risk_scores(df)
+        n_cells, n_levels = len(self.cells), len(RISK_LEVELS)
+
+        # Cell first, then highest score; lexsort is stable, so ties keep row order.
+        self.rows = np.lexsort((-self.scores, row_cells))
+        self.starts = np.concatenate([[0], np.cumsum(np.bincount(row_cells, minlength=n_cells))])
+        self.level_counts = np.bincount(row_cells * n_levels + self.levels,
+                                        minlength=n_cells * n_levels).reshape(n_cells, n_levels)
+
+    def _ranges(self, selected_region, genres, genders, purchase_filter, level):
+        cells = np.flatnonzero(cell_mask(self.cells, selected_region, genres, genders, purchase_filter))
+        # Levels are sorted descending within a cell, so `level` and above is a prefix.
+        lowest = 0 if level is None else RISK_LEVELS.index(level)
+        return self.starts[cells], self.level_counts[cells, lowest:].sum(axis=1)
+
+    def count(self, selected_region, genres, genders, purchase_filter, level=None):
+        """
+        Number of players of the selection (at `level` or above).
+        """
+        return int(self._ranges(selected_region, genres, genders, purchase_filter, level)[1].sum())
+
+    def top_k(self, selected_region, genres, genders, purchase_filter, k=10, offset=0, level=None):
+        """
+        Positions of the players ranked offset .. offset + k by churn risk within the
+        selection (highest first), optionally only those at `level` or above.
+        """
+        starts, lengths = self._ranges(selected_region, genres, genders, purchase_filter, level)
+        need = offset + k
+        parts = [self.rows[s:s + n] for s, n in zip(starts, np.minimum(lengths, need)) if n]
+        if not parts:
+            return np.empty(0, dtype=np.int64)
+        return _ranked(np.concatenate(parts), self.scores, offset, k)
+
+
+def benchmark_top_k(df, sizes=(40_000, 1_000_000, 10_000_000), k=50_000, level=None):
+    """
+    Latency of the previous filter + full sort_values against the index query,
+    for the top k players (at `level` or above) of the Global view.
+    """
+    import time
+
+    results = []
+    for size in sizes:
+        data = df.iloc[np.arange(size) % len(df)].reset_index(drop=True)
+        start = time.perf_counter()
+        index = RiskIndex(data)
+        build = time.perf_counter() - start
+
+        start = time.perf_counter()
+        at_level = data if level is None else data[data["Risk_Level"].isin(RISK_LEVELS[RISK_LEVELS.index(level):])]
+        at_level.sort_values(by="Churn_Prob", ascending=False).head(k)
+        full_sort = time.perf_counter() - start
+
+        start = time.perf_counter()
+        data.iloc[index.top_k("Global", [], [], "All", k=k, level=level)]
+        query = time.perf_counter() - start
+        results.append({"rows": size, "index_build_s": build, "sort_values_s": full_sort, "index_s": query})
+    return pd.DataFrame(results)
+
+
+if __name__ == "__main__":
+    from data_loader import load_data
+
+    print(benchmark_top_k(load_data()).to_string(index=False))
@@ -0,0 +1,66 @@
+# @Author : Yulia
+# @File   : schema.py
+# @Time   : 2025/9/8
+
+import pandas as pd
+
+
+# Columns read by the AI pipeline and the dashboard modules; everything else stays on disk.
+# JoinDate is optional: without it a synthetic join day is assigned (time_index.py).
+PIPELINE_COLUMNS = ["PlayerID", "Age", "Gender", "Location", "GameGenre", "PlayTimeHours", "InGamePurchases",
+                    "GameDifficulty", "SessionsPerWeek", "AvgSessionDurationMinutes", "PlayerLevel",
+                    "AchievementsUnlocked", "EngagementLevel", "JoinDate"]
+
+# Low-cardinality labels repeated on every row: stored once as categories.
+CATEGORICAL_COLUMNS = ["Gender", "Location", "GameGenre", "GameDifficulty", "EngagementLevel",
+                       "Persona", "Persona_Desc", "Risk_Level"]
+
+# Integer columns are downcast to the narrowest type that holds their actual range.
+INTEGER_COLUMNS = ["PlayerID", "Age", "SessionsPerWeek", "PlayerLevel", "InGamePurchases",
+                   "AvgSessionDurationMinutes", "AchievementsUnlocked", "Cluster", "Is_Churn", "JoinDay"]
+
+# Continuous measures only need single precision for analytics and charts.
+FLOAT_COLUMNS = ["PlayTimeHours", "Churn_Prob"]
+
+
+def apply_schema(df):
+    """
+    Convert the player frame to its compact dtypes in place and return it.
+    Columns that are absent or already converted are left untouched, so the
+    function can be applied at ingest and again after the AI columns are added.
+    """
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns and not isinstance(df[col].dtype, pd.CategoricalDtype):
+            df[col] = df[col].astype("category")
+
+    for col in INTEGER_COLUMNS:
+        if col in df.columns and pd.api.types.is_integer_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col], downcast="integer")
+
+    for col in FLOAT_COLUMNS:
+        if col in df.columns and pd.api.types.is_float_dtype(df[col]):
+            df[col] = pd.to_numeric(df[col], downcast="float")
+
+    return df
+
+
+def memory_report(before, after):
+    """
+    Bytes per column before and after the schema is applied.
+    """
+    report = pd.DataFrame({
+        "dtype_before": before.dtypes.astype(str),
+        "bytes_before": before.memory_usage(deep=True, index=False),
+        "dtype_after": after.dtypes.astype(str),
+        "bytes_after": after.memory_usage(deep=True, index=False),
+    })
+    report.loc["TOTAL", ["bytes_before", "bytes_after"]] = report[["bytes_before", "bytes_after"]].sum()
+    report["ratio"] = (report["bytes_after"] / report["bytes_before"]).round(3)
+    return report
+
+
+if __name__ == "__main__":
+    from data_loader import CLEAN_FILE
+
+    raw = pd.read_csv(CLEAN_FILE)
+    print(memory_report(raw, apply_schema(raw.copy())).to_string())
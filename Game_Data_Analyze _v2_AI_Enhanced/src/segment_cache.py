@@ -0,0 +1,66 @@
+# @Author : Yulia
+# @File   : segment_cache.py
+# @Time   : 2025/9/14
+
+import os
+import threading
+from collections import OrderedDict
+
+
+# Byte budget for cached segments (SEGMENT_CACHE_MB overrides it).
+DEFAULT_MAX_BYTES = int(os.environ.get("SEGMENT_CACHE_MB", 256)) * 1024 * 1024
+
+
+def segment_key(selected_region, genres, genders, purchase_filter):
+    """
+    Normalized filter tuple: multiselect order does not matter.
+    """
+    return (selected_region, frozenset(genres or ()), frozenset(genders or ()), purchase_filter)
+
+
+class SegmentCache:
+    """
+    LRU cache of filtered segments, bounded by the total in-memory size of the
+    cached frames. Shared by every module and session, so switching pages on the
+    same filters never re-filters. Cached frames must be treated as read-only.
+    """
+
+    def __init__(self, max_bytes=DEFAULT_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_or_compute(self, key, compute):
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+                self.hits += 1
+                return self._items[key][0]
+            self.misses += 1
+
+        data = compute()
+        size = int(data.memory_usage(deep=True).sum())
+
+        with self._lock:
+            if key not in self._items and size <= self.max_bytes:
+                self._items[key] = (data, size)
+                self.bytes += size
+                while self.bytes > self.max_bytes:
+                    _, (_, evicted) = self._items.popitem(last=False)
+                    self.bytes -= evicted
+                    self.evictions += 1
+        return data
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._items), "bytes": self.bytes, "max_bytes": self.max_bytes,
+                    "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
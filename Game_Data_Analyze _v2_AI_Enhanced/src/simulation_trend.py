@@ -3,47 +3,42 @@
 # @Time   : 2025/9/3
 
 import streamlit as st
-import pandas as pd
-import numpy as np
 import plotly.express as px
 
+from instrumentation import traced
+from time_index import GRANULARITIES, JOIN_DAY, assign_join_days, trend_table
 
-def render_trend(filtered_data, render=True):
-    # Make a copy of the data to avoid contaminating the original data
-    tmp = filtered_data.copy()
 
-    if "JoinDate" not in tmp.columns:
-        np.random.seed(42)
-        tmp["JoinDate"] = pd.to_datetime(
-            np.random.choice(pd.date_range("2024-01-01", "2024-12-31"), size=len(tmp))
-        )
+@traced()
+def render_trend(filtered_data, render=True, granularity="Monthly", window=1):
+    """
+    Trends over the players' join dates (JoinDay, assigned once when the data is
+    loaded), bucketed by day / week / month; `window` smooths over trailing buckets.
+    """
+    if render:
+        st.subheader("📊 Simulation Trend Analysis")
+        col_g, col_w = st.columns(2)
+        granularity = col_g.radio("Granularity", list(GRANULARITIES), horizontal=True,
+                                  index=list(GRANULARITIES).index(granularity), key="trend_granularity")
+        window = col_w.slider("Rolling window (buckets)", 1, 12, window, key="trend_window")
 
-    tmp["Month"] = tmp["JoinDate"].dt.to_period("M").astype(str)
-    if "PlayerID" not in tmp.columns:
-        tmp["PlayerID"] = range(1, len(tmp) + 1)
+    if JOIN_DAY not in filtered_data.columns:
+        # Frames that did not come through the loading pipeline get their join days here.
+        filtered_data = assign_join_days(filtered_data.copy())
 
     # Generate trend data
-    trend = tmp.groupby("Month").agg({
-        "PlayerID": "count",
-        "InGamePurchases": "sum",
-        "SessionsPerWeek": "mean"
-    }).reset_index()
-
-    trend.rename(columns={
-        "PlayerID": "New Players",
-        "InGamePurchases": "Paying Players",
-        "SessionsPerWeek": "Average Sessions"
-    }, inplace=True)
-
-    fig_new = px.line(trend, x="Month", y="New Players", markers=True,
-                      title="📈 New Players per Month")
-    fig_purchase_trend = px.line(trend, x="Month", y="Paying Players", markers=True,
-                                 title="💰 Paying Players per Month")
-    fig_sessions_trend = px.line(trend, x="Month", y="Average Sessions", markers=True,
-                                 title="🕹️ Average Sessions per Month")
+    trend = trend_table(filtered_data, granularity, window)
+    unit = {"Daily": "Day", "Weekly": "Week", "Monthly": "Month"}[granularity]
+    suffix = f" ({window}-{unit.lower()} rolling)" if window > 1 else ""
+
+    fig_new = px.line(trend, x="Date", y="New Players", markers=True,
+                      title=f"📈 New Players per {unit}{suffix}")
+    fig_purchase_trend = px.line(trend, x="Date", y="Paying Players", markers=True,
+                                 title=f"💰 Paying Players per {unit}{suffix}")
+    fig_sessions_trend = px.line(trend, x="Date", y="Average Sessions", markers=True,
+                                 title=f"🕹️ Average Sessions per {unit}{suffix}")
 
     if render:
-        st.subheader("📊 Simulation Trend Analysis")
         col10, col11 = st.columns(2)
         with col10:
             st.plotly_chart(fig_new, use_container_width=True)
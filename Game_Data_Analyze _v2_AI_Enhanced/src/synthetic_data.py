@@ -0,0 +1,268 @@
+# @Author : Yulia
+# @File   : synthetic_data.py
+# @Time   : 2025/9/25
+
+"""
+Synthetic players with the distributions of gaming_data_cleaned.csv, for load
+testing at production scale offline.
+
+Usage (from the src folder):
+    python synthetic_data.py players_10m.csv --rows 10000000 [--seed 0] [--chunk-rows 1000000] [--workers 4]
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from scipy.special import ndtr, ndtri
+
+from time_index import EPOCH, SPAN_DAYS
+
+try:
+    import pyarrow as pa
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+except ImportError:  # CSV is then written with pandas; Parquet needs pyarrow.
+    pa = None
+
+
+# Label columns sampled jointly from their observed combinations, so the mix of
+# genres / genders / difficulty / payers / engagement per Location x GameGenre is kept.
+CATEGORY_COLUMNS = ["Location", "GameGenre", "Gender", "GameDifficulty", "InGamePurchases", "EngagementLevel"]
+
+# Measures drawn from a Gaussian copula fitted per COPULA_BY group: each keeps its
+# empirical marginal and the rank correlations with the others (e.g. Age / PlayerLevel /
+# SessionsPerWeek), and SessionsPerWeek stays consistent with the engagement level.
+NUMERIC_COLUMNS = ["Age", "PlayTimeHours", "SessionsPerWeek", "AvgSessionDurationMinutes", "PlayerLevel",
+                   "AchievementsUnlocked"]
+COPULA_BY = "EngagementLevel"
+
+DEFAULT_CHUNK_ROWS = 1_000_000
+GENERATOR_WORKERS = int(os.environ.get("SYNTHETIC_WORKERS", 0)) or os.cpu_count() or 1
+
+
+class PlayerDistribution:
+    """
+    Distribution of the player columns learned from a frame: the joint frequencies of
+    the label columns, and per engagement level the sorted values (marginals) and the
+    normal-score correlation (copula) of the measures.
+    """
+
+    def __init__(self, df):
+        self.columns = [c for c in df.columns if c in CATEGORY_COLUMNS + NUMERIC_COLUMNS + ["PlayerID"]]
+        self.category_columns = [c for c in CATEGORY_COLUMNS if c in df.columns]
+        self.numeric_columns = [c for c in NUMERIC_COLUMNS if c in df.columns]
+        self.integer_columns = {c for c in self.numeric_columns if pd.api.types.is_integer_dtype(df[c])}
+
+        cells = df.groupby(self.category_columns, observed=True).size()
+        self.cells = cells.index.to_frame(index=False)
+        self.cell_cdf = np.cumsum(cells.to_numpy()) / cells.sum()
+
+        # Categorical columns are produced from codes into the observed categories.
+        self.cell_codes, self.categories = {}, {}
+        for c in self.category_columns:
+            codes, uniques = pd.factorize(self.cells[c], sort=True)
+            self.cell_codes[c], self.categories[c] = codes, uniques
+
+        self.groups = {}
+        group_of_row = df[COPULA_BY] if COPULA_BY in self.category_columns else pd.Series(0, index=df.index)
+        for group, rows in df.groupby(group_of_row, observed=True).groups.items():
+            values = df.loc[rows, self.numeric_columns].to_numpy(dtype=np.float64)
+            # Normal scores of the ranks (ties get their average rank).
+            ranks = pd.DataFrame(values).rank().to_numpy()
+            scores = ndtri((ranks - 0.5) / len(values))
+            corr = np.corrcoef(scores, rowvar=False) if len(values) > 1 else np.eye(len(self.numeric_columns))
+            corr = np.nan_to_num(np.atleast_2d(corr)) + np.eye(len(self.numeric_columns)) * 1e-9
+            self.groups[group] = {"sorted": np.sort(values, axis=0), "chol": np.linalg.cholesky(corr)}
+        self.group_codes = (pd.Categorical(self.cells[COPULA_BY], categories=list(self.groups)).codes
+                            if COPULA_BY in self.category_columns else np.zeros(len(self.cells), dtype=np.int8))
+
+    def _quantiles(self, group, u):
+        # Inverse empirical CDF per column: exact observed values for integer columns,
+        # linear interpolation between them for continuous ones.
+        sorted_values = self.groups[group]["sorted"]
+        n = len(sorted_values)
+        out = np.empty_like(u)
+        for j, c in enumerate(self.numeric_columns):
+            if c in self.integer_columns:
+                out[:, j] = sorted_values[np.minimum((u[:, j] * n).astype(np.int64), n - 1), j]
+            else:
+                out[:, j] = np.interp(u[:, j] * (n - 1), np.arange(n), sorted_values[:, j])
+        return out
+
+    def sample(self, n, rng, start_id=1, join_dates=True):
+        """
+        `n` synthetic players as a DataFrame in the source column order, PlayerIDs
+        from `start_id`, plus a JoinDate within the SPAN_DAYS after EPOCH.
+        """
+        cell = np.minimum(np.searchsorted(self.cell_cdf, rng.random(n), side="right"), len(self.cell_cdf) - 1)
+        data = {}
+        for c in self.category_columns:
+            codes = self.cell_codes[c][cell]
+            if pd.api.types.is_numeric_dtype(self.categories[c]):
+                data[c] = self.categories[c].to_numpy()[codes]
+            else:
+                data[c] = pd.Categorical.from_codes(codes, categories=self.categories[c])
+
+        numeric = np.empty((n, len(self.numeric_columns)))
+        row_groups = self.group_codes[cell]
+        for code, group in enumerate(self.groups):
+            rows = np.flatnonzero(row_groups == code)
+            z = rng.standard_normal((len(rows), len(self.numeric_columns))) @ self.groups[group]["chol"].T
+            numeric[rows] = self._quantiles(group, ndtr(z))
+        for j, c in enumerate(self.numeric_columns):
+            data[c] = numeric[:, j].astype(np.int64) if c in self.integer_columns else numeric[:, j]
+
+        data["PlayerID"] = np.arange(start_id, start_id + n, dtype=np.int64)
+        df = pd.DataFrame({c: data[c] for c in self.columns})
+        if join_dates:
+            days = rng.integers(0, SPAN_DAYS, n)
+            df["JoinDate"] = np.datetime64(EPOCH.date(), "D") + days
+        return df
+
+
+def _sample_chunk(distribution, n, seed, start_id, join_dates):
+    return distribution.sample(n, np.random.default_rng(seed), start_id, join_dates)
+
+
+class ChunkWriter:
+    """
+    Appends player chunks to a CSV or Parquet file (format taken from the extension),
+    through pyarrow's writers when available.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.rows = 0
+        self._writer = None
+        self._schema = None
+
+    def _table(self, chunk):
+        table = pa.Table.from_pandas(chunk, preserve_index=False)
+        if self._schema is None:
+            # Plain strings and dates keep the file schema identical across chunks.
+            fields = []
+            for field in table.schema:
+                if pa.types.is_dictionary(field.type):
+                    field = field.with_type(pa.string())
+                elif pa.types.is_timestamp(field.type):
+                    field = field.with_type(pa.date32())
+                fields.append(field)
+            self._schema = pa.schema(fields)
+        return table.cast(self._schema)
+
+    def write(self, chunk):
+        if self.path.endswith(".parquet"):
+            if pa is None:
+                raise RuntimeError("pyarrow is required to write Parquet.")
+            table = self._table(chunk)
+            if self._writer is None:
+                self._writer = pq.ParquetWriter(self.path, table.schema)
+            self._writer.write_table(table)
+        elif pa is not None:
+            table = self._table(chunk)
+            if self._writer is None:
+                self._writer = pa_csv.CSVWriter(self.path, table.schema,
+                                                write_options=pa_csv.WriteOptions(quoting_style="none"))
+            self._writer.write_table(table)
+        else:
+            chunk.to_csv(self.path, mode="a" if self.rows else "w", header=not self.rows, index=False)
+        self.rows += len(chunk)
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+
+
+def generate(distribution, path, rows, chunk_rows=DEFAULT_CHUNK_ROWS, seed=0, workers=None, start_id=1,
+             join_dates=True):
+    """
+    Stream `rows` synthetic players to `path` in chunks of `chunk_rows`.
+
+    Every chunk has its own seed spawned from `seed`, so the file is the same whatever
+    the number of workers; chunks are sampled on a process pool (at most two per
+    worker in flight) and written in order.
+
+    Returns a dict with the rows written, elapsed seconds and rows/sec.
+    """
+    start = time.perf_counter()
+    workers = workers or GENERATOR_WORKERS
+    sizes = [min(chunk_rows, rows - offset) for offset in range(0, rows, chunk_rows)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    tasks = deque((distribution, size, chunk_seed, start_id + i * chunk_rows, join_dates)
+                  for i, (size, chunk_seed) in enumerate(zip(sizes, seeds)))
+
+    writer = ChunkWriter(path)
+    try:
+        if workers > 1 and len(tasks) > 1:
+            with ProcessPoolExecutor(min(workers, len(tasks)), mp_context=mp.get_context("spawn")) as pool:
+                pending = deque()
+                while tasks or pending:
+                    while tasks and len(pending) < 2 * workers:
+                        pending.append(pool.submit(_sample_chunk, *tasks.popleft()))
+                    writer.write(pending.popleft().result())
+        else:
+            for task in tasks:
+                writer.write(_sample_chunk(*task))
+    finally:
+        writer.close()
+
+    elapsed = time.perf_counter() - start
+    return {"rows": writer.rows, "chunks": len(sizes), "seconds": elapsed,
+            "rows_per_sec": writer.rows / elapsed if elapsed > 0 else float("inf")}
+
+
+def fidelity_report(real, synthetic):
+    """
+    Per column: mean / std of the measures and the total variation distance of the
+    label shares, plus the largest difference of the Spearman correlations.
+    """
+    rows = []
+    numeric = [c for c in NUMERIC_COLUMNS if c in real.columns and c in synthetic.columns]
+    for c in numeric:
+        rows.append({"column": c, "real_mean": real[c].mean(), "synthetic_mean": synthetic[c].mean(),
+                     "real_std": real[c].std(), "synthetic_std": synthetic[c].std(), "tv_distance": None})
+    for c in [c for c in CATEGORY_COLUMNS if c in real.columns and c in synthetic.columns]:
+        shares = pd.concat([real[c].astype(str).value_counts(normalize=True),
+                            synthetic[c].astype(str).value_counts(normalize=True)], axis=1).fillna(0)
+        rows.append({"column": c, "tv_distance": 0.5 * (shares.iloc[:, 0] - shares.iloc[:, 1]).abs().sum()})
+    report = pd.DataFrame(rows)
+    corr_gap = (real[numeric].corr("spearman") - synthetic[numeric].corr("spearman")).abs().to_numpy().max()
+    return report, float(corr_gap)
+
+
+def main(argv=None):
+    from data_loader import CLEAN_FILE
+
+    parser = argparse.ArgumentParser(description="Generate synthetic players with the distributions of the data.")
+    parser.add_argument("output", help="Output CSV or Parquet file")
+    parser.add_argument("--rows", type=int, default=1_000_000, help="Number of players")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (same seed, same file)")
+    parser.add_argument("--chunk-rows", type=int, default=DEFAULT_CHUNK_ROWS, help="Rows per chunk")
+    parser.add_argument("--workers", type=int, default=GENERATOR_WORKERS, help="Sampling processes")
+    parser.add_argument("--source", default=CLEAN_FILE, help="File to learn the distributions from")
+    parser.add_argument("--no-join-dates", action="store_true", help="Leave out the JoinDate column")
+    args = parser.parse_args(argv)
+
+    real = pd.read_csv(args.source, usecols=lambda c: c in CATEGORY_COLUMNS + NUMERIC_COLUMNS + ["PlayerID"])
+    distribution = PlayerDistribution(real)
+    if os.path.exists(args.output):
+        os.remove(args.output)
+    stats = generate(distribution, args.output, args.rows, args.chunk_rows, args.seed, args.workers,
+                     start_id=int(real["PlayerID"].max()) + 1 if "PlayerID" in real.columns else 1,
+                     join_dates=not args.no_join_dates)
+    print(f"Generated {stats['rows']:,} players in {stats['seconds']:.2f}s "
+          f"({stats['rows_per_sec']:,.0f} rows/sec) -> {args.output}")
+
+    report, corr_gap = fidelity_report(real, distribution.sample(min(args.rows, 200_000), np.random.default_rng(args.seed)))
+    print(report.to_string(index=False, float_format=lambda v: f"{v:.3f}"))
+    print(f"Max Spearman correlation difference: {corr_gap:.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+# @Author : Yulia
+# @File   : time_index.py
+# @Time   : 2025/9/19
+
+import numpy as np
+import pandas as pd
+
+
+# Join dates are stored as whole days since EPOCH in the JoinDay column.
+EPOCH = pd.Timestamp("2024-01-01")
+JOIN_DAY = "JoinDay"
+
+# Players without a real JoinDate get a synthetic one within the first SPAN_DAYS (2024).
+SPAN_DAYS = 366
+
+# Trend granularity -> pandas frequency of the bucket starts.
+GRANULARITIES = {"Daily": "D", "Weekly": "W-MON", "Monthly": "MS"}
+
+
+def synthetic_join_days(player_ids, span=SPAN_DAYS):
+    """
+    Deterministic day offset per player: a hash of the PlayerID, so a player always
+    gets the same date whatever the filter or run.
+    """
+    hashes = pd.util.hash_array(np.asarray(player_ids, dtype=np.int64))
+    return (hashes % np.uint64(span)).astype(np.int32)
+
+
+def assign_join_days(df):
+    """
+    Add the JoinDay column (in place) and return the frame. A real JoinDate column is
+    converted to day offsets and dropped; otherwise the synthetic days are used.
+    """
+    if "JoinDate" in df.columns:
+        dates = pd.to_datetime(df["JoinDate"], errors="coerce")
+        days = ((dates - EPOCH).dt.days).to_numpy(dtype=np.float64)
+        missing = np.isnan(days)
+        if missing.any():
+            days[missing] = synthetic_join_days(_player_ids(df)[missing])
+        df[JOIN_DAY] = days.astype(np.int32)
+        del df["JoinDate"]
+    else:
+        df[JOIN_DAY] = synthetic_join_days(_player_ids(df))
+    return df
+
+
+def _player_ids(df):
+    return df["PlayerID"].to_numpy() if "PlayerID" in df.columns else np.arange(len(df))
+
+
+class TimeIndex:
+    """
+    Players sorted by JoinDay. Rows of the scored store are kept in JoinDay order, so
+    for a loaded or filtered frame the sort is usually a no-op check. Any bucketing
+    (day / week / month) is then a np.searchsorted of the bucket starts, and bucket
+    sums are differences of cumulative sums.
+    """
+
+    def __init__(self, days):
+        days = np.asarray(days)
+        self.order = None
+        if len(days) > 1 and (np.diff(days) < 0).any():
+            self.order = np.argsort(days, kind="stable")
+            days = days[self.order]
+        self.days = days
+
+    def bucket_starts(self, granularity):
+        """
+        Start day offset of every bucket from the first to the last join, plus the
+        offset one past the end.
+        """
+        first, last = EPOCH + pd.Timedelta(days=int(self.days[0])), EPOCH + pd.Timedelta(days=int(self.days[-1]))
+        offset = pd.tseries.frequencies.to_offset(GRANULARITIES[granularity])
+        # The first bucket starts on its calendar boundary (Monday / 1st of the month).
+        starts = pd.date_range(offset.rollback(first), last, freq=offset)
+        offsets = (starts - EPOCH).days.to_numpy()
+        return starts, np.append(offsets, int(self.days[-1]) + 1)
+
+    def bucket_sums(self, edges, values=None):
+        """
+        Row count (values None) or sum of `values` per [edges[i], edges[i + 1]) bucket.
+        """
+        positions = np.searchsorted(self.days, edges, side="left")
+        if values is None:
+            return np.diff(positions)
+        values = np.asarray(values, dtype=np.float64)
+        if self.order is not None:
+            values = values[self.order]
+        cumulative = np.concatenate([[0.0], np.cumsum(values)])
+        return np.diff(cumulative[positions])
+
+
+def _trailing_sums(values, window):
+    cumulative = np.concatenate([[0.0], np.cumsum(values)])
+    lower = np.maximum(np.arange(1, len(values) + 1) - window, 0)
+    return cumulative[1:] - cumulative[lower]
+
+
+def trend_table(df, granularity="Monthly", window=1):
+    """
+    New players, paying players and average sessions per time bucket. With
+    window > 1 each value is taken over the trailing `window` buckets (counts as a
+    mean per bucket, average sessions weighted by players).
+    """
+    columns = ["Date", "New Players", "Paying Players", "Average Sessions"]
+    if len(df) == 0 or JOIN_DAY not in df.columns:
+        return pd.DataFrame(columns=columns)
+
+    index = TimeIndex(df[JOIN_DAY].to_numpy())
+    starts, edges = index.bucket_starts(granularity)
+    counts = index.bucket_sums(edges).astype(np.float64)
+    paying = index.bucket_sums(edges, df["InGamePurchases"].to_numpy())
+    sessions = index.bucket_sums(edges, df["SessionsPerWeek"].to_numpy())
+
+    # Trailing sums over `window` buckets (window 1 keeps the buckets as they are).
+    window = max(int(window), 1)
+    spans = np.minimum(np.arange(1, len(counts) + 1), window)
+    counts, paying, sessions = (_trailing_sums(v, window) for v in (counts, paying, sessions))
+    average = np.divide(sessions, counts, out=np.full(len(counts), np.nan), where=counts > 0)
+
+    return pd.DataFrame(dict(zip(columns, [starts, counts / spans, paying / spans, average])))
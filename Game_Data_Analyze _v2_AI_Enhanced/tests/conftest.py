@@ -0,0 +1,9 @@
+# @Author : Yulia
+# @File   : conftest.py
+# @Time   : 2025/9/27
+
+import os
+import sys
+
+# The modules use flat imports and are run from the src folder.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
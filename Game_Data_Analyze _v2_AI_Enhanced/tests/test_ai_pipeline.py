@@ -0,0 +1,47 @@
+# @Author : Yulia
+# @File   : test_ai_pipeline.py
+# @Time   : 2025/9/28
+
+import numpy as np
+import pandas as pd
+from sklearn.cluster import KMeans
+
+import ai_pipeline
+
+
+def _players(n=5000, seed=3):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "Age": rng.integers(15, 50, n),
+        "SessionsPerWeek": rng.integers(0, 20, n),
+        "PlayerLevel": rng.integers(1, 100, n),
+        "InGamePurchases": rng.integers(0, 2, n),
+    })
+
+
+def test_pool_training_matches_inline(monkeypatch):
+    monkeypatch.setattr(ai_pipeline, "PARALLEL_MIN_ROWS", 1000)
+    df = _players()
+    inline = ai_pipeline.train_models(df, workers=1)
+    pooled = ai_pipeline.train_models(df, workers=2)
+
+    assert pooled["timings"]["workers"] == 2
+    for models in (inline, pooled):
+        timings = models["timings"]
+        assert 0 <= timings["kmeans"] <= timings["total"]
+        assert 0 <= timings["churn_model"] <= timings["total"]
+    np.testing.assert_allclose(pooled["kmeans"].cluster_centers_, inline["kmeans"].cluster_centers_)
+    np.testing.assert_allclose(pooled["churn_model"].coef_, inline["churn_model"].coef_)
+    assert pooled["stats"] == inline["stats"]
+
+
+def test_kmeans_matches_single_fit():
+    df = _players(seed=5)
+    config = ai_pipeline.PIPELINE_CONFIG
+    models = ai_pipeline.train_models(df, workers=1)
+    X_scaled = models["scaler"].transform(df[models["clu_features"]])
+    reference = KMeans(n_clusters=config["n_clusters"], random_state=config["random_state"],
+                       n_init=config["n_init"]).fit(X_scaled)
+
+    np.testing.assert_array_equal(models["kmeans"].labels_, reference.labels_)
+    np.testing.assert_allclose(models["kmeans"].cluster_centers_, reference.cluster_centers_)
@@ -0,0 +1,67 @@
+# @Author : Yulia
+# @File   : test_correlation_engine.py
+# @Time   : 2025/9/27
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from correlation_engine import CORRELATION_COLUMNS, CorrelationStatsStore, correlation_matrices, pair_table
+
+
+def _players(n=40034, seed=7):
+    rng = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        "Location": rng.choice(["Asia", "Europe", "Other", "USA"], n),
+        "GameGenre": rng.choice(["Action", "RPG", "Strategy"], n),
+        "Gender": rng.choice(["Female", "Male"], n),
+        "InGamePurchases": rng.integers(0, 2, n),
+        "Age": rng.integers(15, 50, n),
+        "SessionsPerWeek": rng.integers(0, 20, n),
+        "PlayerLevel": rng.integers(1, 100, n),
+        "PlayTimeHours": rng.random(n) * 24,
+        "AvgSessionDurationMinutes": rng.integers(10, 180, n),
+        "AchievementsUnlocked": rng.integers(0, 50, n),
+        "Churn_Prob": rng.random(n).astype(np.float32),
+    })
+    # Large values make the cancellation in cross / n - mean^2 visible.
+    df["PlayTimeHours"] += 1e6
+    return df
+
+
+def _select(df, region, genres, purchases):
+    rows = df
+    if region != "Global":
+        rows = rows[rows["Location"] == region]
+    if genres:
+        rows = rows[rows["GameGenre"].isin(genres)]
+    return rows[rows["InGamePurchases"] == purchases]
+
+
+@pytest.mark.parametrize("region, genres", [("Other", ["Action"]), ("Global", []), ("Asia", ["RPG", "Strategy"])])
+def test_query_matches_rows_with_constant_column(region, genres):
+    df = _players()
+    store = CorrelationStatsStore(df)
+    rows = _select(df, region, genres, 1)
+
+    merged = store.query(region, genres, [], "Paid players")
+    expected = correlation_matrices(rows, CORRELATION_COLUMNS)
+
+    # InGamePurchases is constant once the paid players are selected.
+    assert merged["pearson"].loc["InGamePurchases"].isna().all()
+    assert merged["pearson"]["InGamePurchases"].isna().all()
+    pd.testing.assert_frame_equal(merged["pearson"], expected["pearson"], atol=1e-9)
+    pd.testing.assert_frame_equal(merged["pearson_p"], expected["pearson_p"], atol=1e-9)
+
+    table = pair_table(correlation_matrices(rows, CORRELATION_COLUMNS, pearson=merged))
+    assert len(table) == len(pair_table(expected))
+    assert not table["Variable Pairs"].str.contains("InGamePurchases").any()
+
+
+def test_update_keeps_constant_detection():
+    df = _players()
+    store = CorrelationStatsStore(df.iloc[:15000])
+    store.update(df.iloc[15000:])
+    merged = store.query("Europe", [], [], "Not-paid players")
+    expected = correlation_matrices(_select(df, "Europe", [], 0), CORRELATION_COLUMNS)
+    pd.testing.assert_frame_equal(merged["pearson"], expected["pearson"], atol=1e-9)
@@ -0,0 +1,30 @@
+# @Author : Yulia
+# @File   : test_ingest.py
+# @Time   : 2025/9/28
+
+import numpy as np
+import pandas as pd
+
+from ingest import RowHashSet, stream_clean_csv
+
+
+def test_row_hash_set_marks_first_occurrences():
+    seen = RowHashSet()
+    assert seen.add_new([5, 3, 5, 9]).tolist() == [True, True, False, True]
+    assert seen.add_new([9, 1, 7, 1, 3]).tolist() == [False, True, True, False, False]
+    assert len(seen) == 5
+    assert np.all(np.diff(seen._hashes.astype(np.float64)) > 0)
+
+
+def test_stream_clean_csv_matches_drop_duplicates(tmp_path):
+    rng = np.random.default_rng(1)
+    raw = pd.DataFrame({"PlayerID": rng.integers(0, 400, 2000), "Location": rng.choice(["Asia", "USA"], 2000),
+                        "PlayTimeHours": rng.integers(0, 3, 2000) * 0.5})
+    raw_file, clean_file = tmp_path / "raw.csv", tmp_path / "clean.csv"
+    raw.to_csv(raw_file, index=False)
+
+    stats = stream_clean_csv(str(raw_file), str(clean_file), chunk_rows=128)
+
+    expected = raw.drop_duplicates().reset_index(drop=True)
+    pd.testing.assert_frame_equal(pd.read_csv(clean_file), expected)
+    assert stats == {"rows_in": 2000, "rows_out": len(expected), "duplicates": 2000 - len(expected)}
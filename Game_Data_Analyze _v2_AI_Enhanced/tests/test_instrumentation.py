@@ -0,0 +1,109 @@
+# @Author : Yulia
+# @File   : test_instrumentation.py
+# @Time   : 2025/9/28
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+import instrumentation
+
+
+@pytest.fixture(autouse=True)
+def defaults():
+    token = instrumentation._config.set(instrumentation._DEFAULTS)
+    yield
+    instrumentation.configure(enabled=False, memory=False)
+    instrumentation._config.reset(token)
+
+
+def _in_thread(fn):
+    result = {}
+    thread = threading.Thread(target=lambda: result.update(value=fn()))
+    thread.start()
+    thread.join()
+    return result["value"]
+
+
+def _allocate(name, started=None, release=None):
+    with instrumentation.span(name):
+        block = bytearray(8 * 2 ** 20)
+        if started is not None:
+            started.set()
+            release.wait(5)
+        del block
+
+
+def test_settings_are_per_context():
+    instrumentation.configure(enabled=True, scope="session-a")
+
+    assert _in_thread(instrumentation.settings)["enabled"] is False
+    assert _in_thread(instrumentation.propagate(instrumentation.settings))["scope"] == "session-a"
+    assert instrumentation.settings()["scope"] == "session-a"
+
+
+def test_records_filtered_by_scope_and_thread():
+    mark = instrumentation.mark()
+    instrumentation.configure(enabled=True, scope="session-a")
+    with instrumentation.span("own"):
+        pass
+    with ThreadPoolExecutor(2) as pool:
+        pool.submit(instrumentation.propagate(_allocate), "job").result()
+
+    def other_session():
+        instrumentation.configure(enabled=True, scope="session-b")
+        with instrumentation.span("other"):
+            pass
+    _in_thread(other_session)
+
+    assert set(instrumentation.records(mark)["name"]) == {"own", "job", "other"}
+    assert set(instrumentation.records(mark, scope="session-a")["name"]) == {"own", "job"}
+    assert list(instrumentation.records(mark, scope="session-a", thread_id=threading.get_ident())["name"]) == ["own"]
+
+
+def test_memory_peak_only_without_overlap():
+    mark = instrumentation.mark()
+    instrumentation.configure(enabled=True, memory=True, scope="session-a")
+    _allocate("alone")
+
+    started, release = threading.Event(), threading.Event()
+    worker = threading.Thread(target=instrumentation.propagate(_allocate), args=("background", started, release))
+    worker.start()
+    started.wait(5)
+    _allocate("overlapped")
+    release.set()
+    worker.join()
+
+    peaks = instrumentation.records(mark).set_index("name")["peak_mb"]
+    assert peaks["alone"] > 7.5
+    assert peaks.isna()[["background", "overlapped"]].all()
+
+
+def test_memory_tracing_stops_with_last_scope():
+    instrumentation.configure(enabled=True, memory=True, scope="session-a")
+
+    def other_session():
+        instrumentation.configure(enabled=True, memory=True, scope="session-b")
+        instrumentation.configure(memory=False)
+        return instrumentation.tracemalloc.is_tracing()
+
+    assert _in_thread(other_session) is True
+    instrumentation.configure(memory=False)
+    assert not instrumentation.tracemalloc.is_tracing()
+
+
+def test_memory_tracing_lapses_for_abandoned_scope(monkeypatch):
+    monkeypatch.setattr(instrumentation, "MEMORY_LEASE_S", 0.05)
+
+    def abandoned_session():
+        instrumentation.configure(enabled=True, memory=True, scope="session-gone")
+    _in_thread(abandoned_session)
+    assert instrumentation.tracemalloc.is_tracing()
+
+    time.sleep(0.1)
+    # The next rerun of any other session drops the lapsed scope.
+    instrumentation.configure(enabled=True, memory=False, scope="session-a")
+    assert not instrumentation.tracemalloc.is_tracing()
+    assert "session-gone" not in instrumentation._memory_scopes
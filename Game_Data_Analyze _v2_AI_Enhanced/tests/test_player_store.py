@@ -0,0 +1,184 @@
+# @Author : Yulia
+# @File   : test_player_store.py
+# @Time   : 2025/9/28
+
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import ai_pipeline
+import model_store
+import player_store
+from data_loader import CLEAN_FILE
+from time_index import JOIN_DAY
+
+
+def _scored(n, seed, regions=("Asia", "Europe", "USA")):
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        "PlayerID": rng.integers(0, 10 ** 6, n),
+        "Location": rng.choice(list(regions), n),
+        "GameGenre": rng.choice(["Action", "RPG"], n),
+        "Gender": rng.choice(["Female", "Male"], n),
+        "InGamePurchases": rng.integers(0, 2, n),
+        "Age": rng.integers(15, 50, n),
+        "SessionsPerWeek": rng.integers(0, 20, n),
+        "PlayerLevel": rng.integers(1, 100, n),
+        "PlayTimeHours": rng.random(n) * 24,
+        "AvgSessionDurationMinutes": rng.integers(10, 180, n),
+        "AchievementsUnlocked": rng.integers(0, 50, n),
+        "Churn_Prob": rng.random(n).astype(np.float32),
+        JOIN_DAY: rng.integers(0, 365, n),
+    })
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    directory = tmp_path / "scored"
+    directory.mkdir()
+    monkeypatch.setattr(player_store, "STORE_DIR", str(directory))
+    monkeypatch.setattr(player_store, "META_FILE", str(directory / "players_scored.json"))
+    monkeypatch.setattr(player_store, "CORR_STATS_FILE", str(directory / "correlation_stats.joblib"))
+    source = tmp_path / "players.csv"
+    source.write_text("placeholder\n", encoding="utf-8")
+    return str(source)
+
+
+def _append(batch, source):
+    # The storage half of append_players (scoring needs trained models).
+    meta = player_store._read_meta()
+    partitions, fragments, superseded = player_store._append_fragments(batch, meta["partitions"], meta["fragments"])
+    player_store._write_meta({**meta, "partitions": partitions, "fragments": fragments})
+    player_store._remove_files(superseded)
+
+
+def _sorted(df):
+    return df.sort_values(["PlayerID", JOIN_DAY]).reset_index(drop=True)
+
+
+def test_append_writes_fragments_and_compacts(store):
+    base = _scored(3000, 0)
+    player_store.save_scored(base, store, {"key": None}, stats={})
+    batches = [_scored(50, seed, ("Asia", "Oceania")) for seed in range(1, player_store.MAX_FRAGMENTS + 2)]
+
+    asia_file = player_store._read_meta()["partitions"]["Asia"]
+    asia_mtime = os.path.getmtime(os.path.join(player_store.STORE_DIR, asia_file))
+    for i, batch in enumerate(batches[:-1]):
+        _append(batch, store)
+        meta = player_store._read_meta()
+        # Existing partitions are left untouched until the region is compacted.
+        assert meta["partitions"]["Asia"] == asia_file
+        assert os.path.getmtime(os.path.join(player_store.STORE_DIR, asia_file)) == asia_mtime
+        assert len(meta["fragments"]["Asia"]) == i + 1
+    assert "Oceania" in meta["partitions"]
+
+    _append(batches[-1], store)
+    meta = player_store._read_meta()
+    assert "Asia" not in meta["fragments"]
+    assert meta["partitions"]["Asia"] != asia_file
+    assert len(meta["fragments"]["Oceania"]) == player_store.MAX_FRAGMENTS
+    assert sorted(os.listdir(player_store.STORE_DIR)) == sorted(
+        player_store._store_files(meta) + ["players_scored.json", "correlation_stats.joblib"])
+
+    expected = player_store.apply_schema(pd.concat([base] + batches, ignore_index=True))
+    for regions in (None, ["Asia"], ["Oceania", "USA"]):
+        loaded = player_store.load_scored(store, regions)
+        wanted = expected if regions is None else expected[expected["Location"].isin(regions)]
+        pd.testing.assert_frame_equal(_sorted(loaded), _sorted(wanted), check_categorical=False)
+
+    asia = player_store.load_scored(store, ["Asia"])
+    assert asia[JOIN_DAY].is_monotonic_increasing
+
+
+def test_save_scored_removes_fragments(store):
+    player_store.save_scored(_scored(1000, 0), store, {"key": None}, stats={})
+    _append(_scored(20, 1), store)
+    player_store.save_scored(_scored(1000, 2), store, {"key": None}, stats={})
+
+    meta = player_store._read_meta()
+    assert meta["fragments"] == {}
+    assert sorted(os.listdir(player_store.STORE_DIR)) == sorted(
+        player_store._store_files(meta) + ["players_scored.json", "correlation_stats.joblib"])
+
+
+def test_readers_of_a_replaced_meta_keep_their_files(store, monkeypatch):
+    player_store.save_scored(_scored(1000, 0), store, {"key": None}, stats={})
+    old = player_store._read_meta()
+    _append(_scored(20, 1), store)
+
+    # Files of the previous meta are only unlinked after the new meta is written.
+    writes = []
+    write_meta = player_store._write_meta
+
+    def checked_write(meta):
+        writes.append(all(os.path.exists(os.path.join(player_store.STORE_DIR, f))
+                          for f in player_store._store_files(old)))
+        write_meta(meta)
+    monkeypatch.setattr(player_store, "_write_meta", checked_write)
+
+    player_store.save_scored(_scored(1000, 2), store, {"key": None}, stats={})
+    assert writes == [True]
+    assert not any(os.path.exists(os.path.join(player_store.STORE_DIR, f)) for f in player_store._store_files(old))
+
+
+def test_concurrent_appends_keep_every_batch_and_refit_once(store, monkeypatch):
+    players = pd.read_csv(CLEAN_FILE, nrows=2400)
+    players.iloc[:2000].to_csv(store, index=False)
+    base = player_store.apply_schema(player_store.assign_join_days(players.iloc[:2000].copy()))
+    models = ai_pipeline.train_models(base)
+    models["key"] = "test"
+    player_store.save_scored(player_store.apply_schema(ai_pipeline.score_players(base, models)), store, models)
+    monkeypatch.setattr(model_store, "load_models", lambda key: models)
+
+    refits = []
+
+    def slow_refit(source_file):
+        refits.append(source_file)
+        time.sleep(0.5)
+    monkeypatch.setattr(player_store, "build_scored", slow_refit)
+
+    always = {"centroid_shift": -1.0, "churn_rate_delta": -1.0}
+    threads = [threading.Thread(target=player_store.append_players, args=(players.iloc[lo:lo + 100], store, always))
+               for lo in range(2000, 2400, 100)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    while player_store._refit_thread is not None:
+        time.sleep(0.05)
+
+    assert len(refits) == 1
+    assert len(player_store.load_scored(store)) == 2400
+    assert len(pd.read_csv(store)) == 2400
+
+
+def test_evaluation_uses_training_rows(tmp_path, monkeypatch):
+    monkeypatch.setattr(model_store, "save_models", lambda key, models: None)
+    players = pd.read_csv(CLEAN_FILE, nrows=3000)
+    source = tmp_path / "players.csv"
+    players.iloc[:2000].to_csv(source, index=False)
+
+    training = player_store.apply_schema(player_store.assign_join_days(players.iloc[:2000].copy()))
+    models = ai_pipeline.train_models(training)
+    models["key"] = model_store.training_fingerprint(training, ai_pipeline.PIPELINE_FEATURES,
+                                                     ai_pipeline.PIPELINE_CONFIG)
+    expected = ai_pipeline.evaluate_churn_model(training)
+
+    # Players appended after training (with every label flipped) must not count.
+    appended = players.iloc[2000:].assign(SessionsPerWeek=lambda d: np.where(d["SessionsPerWeek"] < 2, 10, 0))
+    appended.to_csv(source, mode="a", header=False, index=False)
+    evaluation = player_store.model_evaluation(str(source), models)
+
+    assert evaluation["n"] == 2000
+    for key in ("accuracy", "roc_auc", "brier", "churn_rate"):
+        assert evaluation[key] == pytest.approx(expected[key])
+    assert models["evaluation"] is evaluation
+
+    # A rewritten source no longer holds the training rows.
+    models.pop("evaluation")
+    players.iloc[1000:].to_csv(source, index=False)
+    assert player_store.model_evaluation(str(source), models) is None
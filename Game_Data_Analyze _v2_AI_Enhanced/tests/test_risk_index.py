@@ -0,0 +1,51 @@
+# @Author : Yulia
+# @File   : test_risk_index.py
+# @Time   : 2025/9/29
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ai_pipeline import RISK_LEVELS, risk_levels
+from risk_index import RiskIndex, top_k_rows
+
+
+def _players(n=6000, seed=11):
+    # Few distinct probabilities: most players tie with others at every page boundary.
+    rng = np.random.default_rng(seed)
+    probs = rng.choice(np.array([0.09, 0.1, 0.11, 0.45, 0.8], dtype=np.float32), n, p=[0.4, 0.3, 0.2, 0.07, 0.03])
+    return pd.DataFrame({
+        "Location": rng.choice(["Asia", "Europe", "USA"], n),
+        "GameGenre": rng.choice(["Action", "RPG"], n),
+        "Gender": rng.choice(["Female", "Male"], n),
+        "InGamePurchases": rng.integers(0, 2, n),
+        "Churn_Prob": probs,
+        "Risk_Level": risk_levels(probs),
+    })
+
+
+def _stable_order(df, level):
+    rows = df[df["Risk_Level"].isin(RISK_LEVELS[RISK_LEVELS.index(level):])] if level else df
+    return rows.sort_values("Churn_Prob", ascending=False, kind="stable").index.to_numpy()
+
+
+@pytest.mark.parametrize("level", [None, RISK_LEVELS[0], RISK_LEVELS[1]])
+def test_pages_match_stable_sort(level):
+    df = _players()
+    index = RiskIndex(df)
+    expected = _stable_order(df, level)
+
+    for page_size in (10, 37):
+        pages = [top_k_rows(df, page_size, offset, level) for offset in range(0, len(expected) + page_size, page_size)]
+        np.testing.assert_array_equal(np.concatenate(pages), expected)
+        pages = [index.top_k("Global", [], [], "All", page_size, offset, level)
+                 for offset in range(0, 1000, page_size)]
+        np.testing.assert_array_equal(np.concatenate(pages), expected[:len(np.concatenate(pages))])
+
+    asia = df[(df["Location"] == "Asia") & (df["InGamePurchases"] == 1)]
+    expected = asia.index.to_numpy()[np.argsort(-asia["Churn_Prob"].to_numpy(), kind="stable")]
+    if level:
+        expected = expected[np.isin(df["Risk_Level"].to_numpy()[expected], RISK_LEVELS[RISK_LEVELS.index(level):])]
+    got = np.concatenate([index.top_k("Asia", [], [], "Paid players", 10, offset, level)
+                          for offset in range(0, 300, 10)])
+    np.testing.assert_array_equal(got, expected[:len(got)])